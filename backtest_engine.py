@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+# Portfolio simulation shared by train_backtest and test_backtest. Positions
+# are an array indexed by symbol id and each day's buys, sells, fees and
+# holdings are array operations over that day's rows. Running totals are
+# accumulated with cumsum, which adds left to right like the original loop,
+# so fed each day's rows in the order the original merge had them, the
+# results are identical to it and not just close. In any other order the
+# float sums can differ in the last bits.
+
+INVESTMENT_PER_DAY = 500000
+
+
+def calculate_fees(num_shares):
+    """Fees of buying or selling each of an array of share counts (eg.tiger website)."""
+    commission = np.maximum(0.0039 * num_shares, 0.99)
+    platform_fee = np.maximum(0.004 * num_shares, 1)
+    external_institution_fee = np.maximum(0.00396 * num_shares, 0.99)
+    return commission + platform_fee + external_institution_fee
+
+
+def _accumulate(total, values):
+    # total += value for each value in order
+    if len(values) == 0:
+        return total
+    return np.cumsum(np.concatenate(([total], values)))[-1]
+
+
+class Portfolio:
+    """Holdings and running totals after the last simulated day, to resume a backtest from."""
+
+    def __init__(self, positions=None, total_investment=0, sold_earning=0, net_earning=0, date=None):
+        self.positions = positions or {}
+        self.total_investment = total_investment
+        self.sold_earning = sold_earning
+        self.net_earning = net_earning
+        self.date = date
+
+
+class BacktestResult:
+    def __init__(self, dates, invested, total_investment, sold_earning, holding_earning, total_earning, net_earning,
+                 portfolio):
+        self.dates = dates
+        self.invested = invested
+        self.total_investment = total_investment
+        self.sold_earning = sold_earning
+        self.holding_earning = holding_earning
+        self.total_earning = total_earning
+        self.net_earning = net_earning
+        self.portfolio = portfolio
+
+    @property
+    def final_net_earning(self):
+        return self.net_earning[-1] if len(self.net_earning) else 0
+
+
+class Backtest:
+    """The merged score/price rows of a backtest, grouped by day once and simulated for any (m, n)."""
+
+    def __init__(self, merged):
+        # Same day order as merged.groupby('Date'), keeping the row order within a day
+        merged = merged.sort_values('Date', kind='stable')
+        self.ids, self.symbols = pd.factorize(merged['Symbol'])
+        self.close = merged['Close'].to_numpy(dtype=float)
+        self.score = merged['technical_analysis_score'].to_numpy()
+        dates = merged['Date'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, dates[1:] != dates[:-1]]) if len(dates) else np.array([], dtype=int)
+        self.dates = dates[starts]
+        self.bounds = list(zip(starts, np.r_[starts[1:], len(dates)]))
+
+    def run(self, m, n, invested=False, portfolio=None):
+        """Buy every stock scoring >= m and sell held ones scoring <= n, day by day.
+
+        invested=True also collects the symbols bought each day, for test_technical_score.
+        Starting from the portfolio of an earlier run continues that run exactly.
+        """
+        portfolio = portfolio or Portfolio()
+        positions = np.array([portfolio.positions.get(symbol, 0) for symbol in self.symbols], dtype=float)
+        held = np.array([symbol in portfolio.positions for symbol in self.symbols], dtype=bool)
+        total_investment = portfolio.total_investment
+        sold_earning = portfolio.sold_earning
+        days = len(self.bounds)
+        bought = []
+        investments, sold, holding, earnings, net_earnings = (np.empty(days) for _ in range(5))
+
+        for day, (start, stop) in enumerate(self.bounds):
+            ids, close, score = self.ids[start:stop], self.close[start:stop], self.score[start:stop]
+
+            buy = score >= m
+            num_stocks = np.count_nonzero(buy)
+            if num_stocks > 0:
+                amount_to_invest = INVESTMENT_PER_DAY / num_stocks
+                num_shares = amount_to_invest / close[buy]
+                positions[ids[buy]] += num_shares
+                held[ids[buy]] = True
+                total_investment = _accumulate(total_investment, amount_to_invest + calculate_fees(num_shares))
+            if invested:
+                bought.append(self.symbols[ids[buy]].tolist())
+
+            sell = (score <= n) & held[ids]
+            if sell.any():
+                sold_ids = ids[sell]
+                shares = positions[sold_ids]
+                sold_earning = _accumulate(sold_earning, shares * close[sell] - calculate_fees(shares))
+                positions[sold_ids] = 0
+                held[sold_ids] = False
+
+            # Summed in row order like the original sum() over the day's rows
+            holding_earning = sum((close * positions[ids]).tolist())
+            investments[day] = total_investment
+            sold[day] = sold_earning
+            holding[day] = holding_earning
+            earnings[day] = sold_earning + holding_earning
+            net_earnings[day] = earnings[day] - total_investment
+
+        # Symbols without rows here keep their earlier positions
+        kept = {symbol: shares for symbol, shares in portfolio.positions.items() if symbol not in self.symbols}
+        kept.update(zip(self.symbols[held].tolist(), positions[held].tolist()))
+        if days:
+            portfolio = Portfolio(kept, total_investment, sold_earning, net_earnings[-1], self.dates[-1])
+        return BacktestResult(self.dates, bought, investments, sold, holding, earnings, net_earnings, portfolio)
+
+    def sweep(self, ms, ns):
+        """Final net earning of run(m, n) for every pair of ms and ns, all simulated together.
+
+        Rows a candidate does not buy or sell add exact zeros to its running
+        totals, so each candidate still gets the same result as run().
+        """
+        ms = np.asarray(ms)[:, None]
+        ns = np.asarray(ns)[:, None]
+        candidates = len(ms)
+        positions = np.zeros((candidates, len(self.symbols)))
+        held = np.zeros((candidates, len(self.symbols)), dtype=bool)
+        total_investment = np.zeros(candidates)
+        sold_earning = np.zeros(candidates)
+        net_earning = np.zeros(candidates)
+
+        for start, stop in self.bounds:
+            ids, close, score = self.ids[start:stop], self.close[start:stop], self.score[start:stop]
+
+            buy = score >= ms
+            num_stocks = np.count_nonzero(buy, axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                amount_to_invest = INVESTMENT_PER_DAY / num_stocks[:, None]
+                num_shares = np.where(buy, amount_to_invest / close, 0)
+            positions[:, ids] += num_shares
+            held[:, ids] |= buy
+            total_investment = _accumulate_rows(
+                total_investment, np.where(buy, amount_to_invest + calculate_fees(num_shares), 0))
+
+            sell = (score <= ns) & held[:, ids]
+            shares = positions[:, ids]
+            sold_earning = _accumulate_rows(
+                sold_earning, np.where(sell, shares * close - calculate_fees(shares), 0))
+            positions[:, ids] = np.where(sell, 0, shares)
+            held[:, ids] &= ~sell
+
+            holding_earning = _accumulate_rows(np.zeros(candidates), close * positions[:, ids])
+            net_earning = (sold_earning + holding_earning) - total_investment
+
+        return net_earning
+
+
+def _accumulate_rows(totals, values):
+    # _accumulate for each row of values, starting from the matching total
+    return np.cumsum(np.concatenate((totals[:, None], values), axis=1), axis=1)[:, -1]
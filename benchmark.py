@@ -0,0 +1,205 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import connect_to_sqlite
+
+# Benchmarks of the pipeline on a deterministic synthetic market, run against
+# a temporary database so no network or existing db.sqlite3 is needed.
+#
+#   python benchmark.py --symbols 100 --days 700
+#   python benchmark.py --save-baseline        # record the timings
+#   python benchmark.py                        # flag stages slower than the baseline
+#
+# The default history covers the train (2022-01-01 to 2023-04-30) and test
+# (2023-05-01 to 2023-10-16) periods of the backtests.
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+
+def generate_ohlcv(n_symbols=100, n_days=700, seed=0, start_date='2021-03-01'):
+    """SPY_stock_data rows of a random walk market, the same for the same arguments."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start_date, periods=n_days).strftime('%Y-%m-%d')
+    frames = []
+    for k in range(n_symbols):
+        close = np.round(100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, n_days))), 2)
+        open_ = np.round(close * (1 + rng.normal(0, 0.01, n_days)), 2)
+        high = np.maximum(open_, close) + np.round(rng.uniform(0, 1, n_days), 2)
+        low = np.maximum(np.minimum(open_, close) - np.round(rng.uniform(0, 1, n_days), 2), 0.01)
+        volume = rng.integers(100000, 10000000, n_days)
+        float_shares = rng.integers(10000000, 1000000000)
+        frames.append(pd.DataFrame({
+            'Date': dates, 'Market': 'US', 'Symbol': f'SYN{k:04d}', 'Company_name': f'Synthetic {k}',
+            'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume,
+            'Market_Cap': float(float_shares * close[-1]), 'Turnover_Rate': 100 * volume / float_shares,
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def measure(name, rows, call, results, trace=False):
+    """Run call() with its output silenced, recording wall time and throughput, or with trace its peak memory.
+
+    Tracing slows the call down several times, so memory is measured in a run of its own.
+    """
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        call()
+    seconds = time.perf_counter() - start
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = {'peak_mb': peak / 2 ** 20}
+        print(f"{name:40s} {peak / 2 ** 20:9.1f} MB peak")
+        return
+    results[name] = {'seconds': seconds, 'rows': rows, 'rows_per_second': rows / seconds if seconds else None}
+    print(f"{name:40s} {seconds:9.3f}s {rows / seconds if seconds else 0:12.0f} rows/s")
+
+
+def run_benchmarks(n_symbols=100, n_days=700, seed=0, engine='vectorized', save_rows=2000, latency=0.01,
+                   trace=False):
+    """Time each stage on a fresh temporary database and return {stage: metrics}.
+
+    Every stage works up to the last synthetic day, not today, so the same
+    arguments always do the same work. latency is the FakeProvider delay per
+    request of the download stage. trace measures peak memory instead of time.
+    """
+    from download_spy_stocks import FakeProvider, download_spy_stocks
+    results = {}
+    stock_data = generate_ohlcv(n_symbols, n_days, seed)
+    end_date = stock_data['Date'].max()
+    db_name = connect_to_sqlite.DB_NAME
+
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            # Ingestion into a database of its own, the bars the downloader asks for since its default start
+            connect_to_sqlite.DB_NAME = os.path.join(tmp, 'download.sqlite3')
+            conn = connect_to_sqlite.get_connection()
+            with conn:
+                conn.execute('CREATE TABLE spy_holdings_symbols (symbol TEXT, company_name TEXT)')
+                conn.executemany('INSERT INTO spy_holdings_symbols VALUES (?, ?)',
+                                 stock_data[['Symbol', 'Company_name']].drop_duplicates().itertuples(index=False))
+            info = {Symbol: {'marketCap': market_cap}
+                    for Symbol, market_cap in stock_data.groupby('Symbol')['Market_Cap'].first().items()}
+            provider = FakeProvider(stock_data, info, latency)
+            download_end = pd.Timestamp(end_date) + pd.Timedelta(days=1)
+            downloaded = (pd.to_datetime(stock_data['Date']) >= download_end - pd.DateOffset(730)).sum()
+            measure('download_spy_stocks', int(downloaded),
+                    lambda: download_spy_stocks(provider=provider, end_date=download_end), results, trace)
+            connect_to_sqlite.close_connection()
+
+            connect_to_sqlite.DB_NAME = os.path.join(tmp, 'db.sqlite3')
+            conn = connect_to_sqlite.get_connection()
+            measure('insert SPY_stock_data', len(stock_data),
+                    lambda: stock_data.to_sql('SPY_stock_data', conn, index=False), results, trace)
+            connect_to_sqlite.create_indexes(conn)
+
+            measure('get_historical_data_from_db (query)', len(stock_data),
+                    lambda: connect_to_sqlite.get_historical_data_from_db(end_date, use_cache=False), results, trace)
+            measure('get_historical_data_from_db (cold cache)', len(stock_data),
+                    lambda: connect_to_sqlite.get_historical_data_from_db(end_date), results, trace)
+            measure('get_historical_data_from_db (warm cache)', len(stock_data),
+                    lambda: connect_to_sqlite.get_historical_data_from_db(end_date), results, trace)
+
+            # Throwaway score rows, cleared before the real scores are computed
+            connect_to_sqlite.create_table()
+            rng = np.random.default_rng(seed)
+            scores = pd.DataFrame({'Symbol': stock_data['Symbol'], 'Score': rng.integers(-20, 20, len(stock_data)),
+                                   'Rank': 1, 'Analysis': 'benchmark', 'Timestamp': stock_data['Date']})
+            single = scores.iloc[:save_rows]
+            measure('save_to_sqlite', len(single), lambda: [
+                connect_to_sqlite.save_to_sqlite(Symbol, int(score), rank, analysis, timestamp)
+                for Symbol, score, rank, analysis, timestamp in single.itertuples(index=False)], results, trace)
+            measure('save_many_to_sqlite', len(scores) - len(single),
+                    lambda: connect_to_sqlite.save_many_to_sqlite(scores.iloc[save_rows:]), results, trace)
+            with conn:
+                conn.execute('DELETE FROM technical_analysis_score')
+                conn.execute('DELETE FROM scored_stock_data')
+
+            from total_score import calculate_total_score
+            days = (pd.Timestamp(end_date) - pd.Timestamp('2022-01-01')).days + 1
+            measure(f'calculate_total_score ({engine})', days * n_symbols,
+                    lambda: calculate_total_score(engine=engine, end_date=end_date), results, trace)
+
+            import train_backtest
+            training_rows = len(connect_to_sqlite.get_scored_stock_data('2022-01-01', '2023-04-30'))
+            measure('train_technical_analysis', training_rows,
+                    lambda: train_backtest.train_technical_analysis(2, -20), results, trace)
+            measure('optimize_parameters', training_rows * 440, train_backtest.optimize_parameters, results, trace)
+
+            import test_backtest
+            test_rows = len(connect_to_sqlite.get_scored_stock_data('2023-05-01', '2023-10-16'))
+            measure('test_technical_analysis', test_rows,
+                    lambda: test_backtest.test_technical_analysis(rebuild=True), results, trace)
+        finally:
+            connect_to_sqlite.close_connection()
+            connect_to_sqlite.DB_NAME = db_name
+    return results
+
+
+REGRESSION_UNITS = {'seconds': 's', 'peak_mb': ' MB peak'}
+
+
+def regressions(results, baseline, tolerance):
+    """{(stage, metric): (value, baseline value)} of the seconds and peak_mb over (1 + tolerance) times their baseline."""
+    return {(name, metric): (metrics[metric], baseline[name][metric])
+            for name, metrics in results.items() for metric in REGRESSION_UNITS
+            if metric in metrics and metric in baseline.get(name, {})
+            and metrics[metric] > baseline[name][metric] * (1 + tolerance)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline on synthetic data.')
+    parser.add_argument('--symbols', type=int, default=100)
+    parser.add_argument('--days', type=int, default=700)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--engine', default='vectorized', choices=['vectorized', 'incremental', 'backtrader'])
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds per request of the fake data provider')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed growth of a stage's time or peak memory over the baseline before it is flagged")
+    args = parser.parse_args(argv)
+
+    print('Timings')
+    results = run_benchmarks(args.symbols, args.days, args.seed, args.engine, latency=args.latency)
+    print('Peak traced memory')
+    memory = run_benchmarks(args.symbols, args.days, args.seed, args.engine, latency=args.latency, trace=True)
+    for name, metrics in memory.items():
+        results[name].update(metrics)
+    config = {'symbols': args.symbols, 'days': args.days, 'seed': args.seed, 'engine': args.engine,
+              'latency': args.latency}
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'config': config, 'results': results}, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['config'] != config:
+        print(f"Baseline was recorded with {baseline['config']}, not comparing")
+        return 0
+    regressed = regressions(results, baseline['results'], args.tolerance)
+    for (name, metric), (value, before) in regressed.items():
+        unit = REGRESSION_UNITS[metric]
+        print(f"REGRESSION {name}: {value:.3f}{unit} vs {before:.3f}{unit} baseline")
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,21 +1,143 @@
+import functools
+import itertools
+import os
+import pickle
+import queue
 import sqlite3
+import threading
+from operator import itemgetter
 import pandas as pd
+from metrics import count, timer
+from panel_cache import PanelCache
 
 DB_NAME = 'db.sqlite3'
 
-def get_historical_data_from_db(end_time):
-    """Fetch historical data for all symbols from the SQLite database up to a specific end time."""
-    conn = sqlite3.connect(DB_NAME)
-    query = f"SELECT * FROM SPY_stock_data WHERE Date <= '{end_time}'"
-    df = pd.read_sql(query, conn)
+# Optional file the panel cache is saved to and started from, e.g. /tmp/panel_cache.pickle
+PANEL_SNAPSHOT = os.environ.get('PANEL_SNAPSHOT')
+
+INDEXES = {
+    'technical_analysis_score': [
+        # Covering indexes of the score queries below, which then never read the table rows.
+        # The one on (Timestamp, score) replaces the plain Timestamp index.
+        'DROP INDEX IF EXISTS idx_technical_analysis_score_timestamp',
+        'CREATE INDEX IF NOT EXISTS idx_technical_analysis_score_timestamp_score '
+        'ON technical_analysis_score (Timestamp, technical_analysis_score, Symbol, Rank)',
+        'CREATE INDEX IF NOT EXISTS idx_technical_analysis_score_timestamp_rank '
+        'ON technical_analysis_score (Timestamp, Rank, Symbol, technical_analysis_score)',
+        'CREATE INDEX IF NOT EXISTS idx_technical_analysis_score_symbol_timestamp '
+        'ON technical_analysis_score (Symbol, Timestamp, technical_analysis_score, Rank)',
+    ],
+    'SPY_stock_data': [
+        # The primary key is (Date, Symbol), which cannot serve per-symbol lookups
+        'CREATE INDEX IF NOT EXISTS idx_spy_stock_data_symbol_date ON SPY_stock_data (Symbol, Date)',
+    ],
+}
+
+_connections = threading.local()
+_panel_caches = {}
+# Path -> rowid of the panel cache last written to PANEL_SNAPSHOT
+_snapshot_rowids = {}
+# (path, pid) of the databases create_table has set up in this process
+_created_tables = set()
+# Bumped by every write to technical_analysis_score from this process
+_score_writes = 0
+
+def get_connection():
+    """The shared connection to DB_NAME for this thread, opened in WAL mode on first use.
+
+    Callers must not close it. WAL lets the downloader write while scoring reads,
+    and busy_timeout waits for a competing writer instead of failing with
+    "database is locked".
+    """
+    key = (os.path.abspath(DB_NAME), os.getpid())
+    pool = getattr(_connections, 'pool', None)
+    if pool is None:
+        pool = _connections.pool = {}
+    if key not in pool:
+        conn = sqlite3.connect(key[0], timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        create_indexes(conn)
+        pool[key] = conn
+    return pool[key]
+
+def close_connection():
+    """Close this thread's connection to DB_NAME and drop its panel cache, e.g. before removing the file."""
+    path = os.path.abspath(DB_NAME)
+    conn = getattr(_connections, 'pool', {}).pop((path, os.getpid()), None)
+    if conn is not None:
+        conn.close()
+    _panel_caches.pop(path, None)
+    _snapshot_rowids.pop(path, None)
+    _created_tables.discard((path, os.getpid()))
+
+def create_indexes(conn=None):
+    """Create the secondary indexes of the tables that exist so far."""
+    conn = conn or get_connection()
+    tables = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    with conn:
+        for table, statements in INDEXES.items():
+            if table in tables:
+                for statement in statements:
+                    conn.execute(statement)
+
+def get_panel_cache(save=True):
+    """The PanelCache of DB_NAME for this process, refreshed with the rows appended since the last call.
+
+    With PANEL_SNAPSHOT set, a new process starts from the cache saved there
+    and the file is rewritten whenever it is behind the cache. save=False
+    leaves that to a later call, e.g. while rows are still being appended.
+    """
+    path = os.path.abspath(DB_NAME)
+    if path not in _panel_caches:
+        snapshot = PanelCache.load(PANEL_SNAPSHOT, path) if PANEL_SNAPSHOT else None
+        _panel_caches[path] = snapshot or PanelCache(path)
+        _snapshot_rowids[path] = snapshot.rowid if snapshot else 0
+    cache = _panel_caches[path]
+    cache.refresh(get_connection())
+    if save and PANEL_SNAPSHOT and cache.rowid != _snapshot_rowids[path]:
+        cache.save(PANEL_SNAPSHOT)
+        _snapshot_rowids[path] = cache.rowid
+    return cache
+
+def get_historical_data_from_db(end_time, use_cache=True):
+    """Fetch historical data for all symbols from the SQLite database up to a specific end time.
+
+    By default the rows come from the in-process panel cache, grouped by symbol
+    in date order, instead of re-reading and re-parsing the table on every call.
+    """
+    if use_cache:
+        return get_panel_cache().frame(end_time)
+    query = "SELECT * FROM SPY_stock_data WHERE Date <= ?"
+    df = pd.read_sql(query, get_connection(), params=(end_time,))
     # Convert the 'Date' column to datetime format
     df['Date'] = pd.to_datetime(df['Date'])
     df.set_index('Date', inplace=True)
-    conn.close()
     return df
 
+def iter_symbol_data(end_time, symbols=None, batch_size=10000):
+    """Yield (Symbol, DataFrame) blocks of SPY_stock_data up to end_time, one symbol at a time.
+
+    Rows are streamed in (Symbol, Date) order off the (Symbol, Date) index and
+    fetched batch_size at a time, so only the current symbol's block is held in
+    memory. Each block is shaped like the rows get_historical_data_from_db
+    returns for that symbol.
+    """
+    query = "SELECT * FROM SPY_stock_data WHERE Date <= ?"
+    params = [end_time]
+    if symbols is not None:
+        query += f" AND Symbol IN ({', '.join('?' * len(symbols))})"
+        params.extend(symbols)
+    cursor = get_connection().execute(query + " ORDER BY Symbol, Date", params)
+    columns = [description[0] for description in cursor.description]
+    rows = itertools.chain.from_iterable(iter(lambda: cursor.fetchmany(batch_size), []))
+    for Symbol, block in itertools.groupby(rows, key=itemgetter(columns.index('Symbol'))):
+        df = pd.DataFrame(list(block), columns=columns)
+        df['Date'] = pd.to_datetime(df['Date'])
+        yield Symbol, df.set_index('Date')
+
 def create_table():
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
 
     # Create the technical_analysis_score table if it doesn't exist
@@ -31,11 +153,92 @@ def create_table():
     )
     ''')
 
+    # One column per strategy holding its signal code, -1 when the strategy failed
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(technical_analysis_score)')}
+    for column in signal_columns():
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE technical_analysis_score ADD COLUMN {column} INTEGER')
+
     conn.commit()
-    conn.close()
+    create_indexes(conn)
+    joined = create_scored_stock_data_table()
+    # Until SPY_stock_data exists the setup is not done, and a later call finishes it
+    if joined:
+        _created_tables.add((os.path.abspath(DB_NAME), os.getpid()))
+
+def signal_columns():
+    from strategy_specs import STRATEGIES
+    return [strategy.name for strategy in STRATEGIES]
+
+def create_scored_stock_data_table():
+    """Create the scored_stock_data join of technical_analysis_score with SPY_stock_data prices.
+
+    The backtests read it instead of merging both tables on every run. Triggers
+    add the joined row whichever of the score and the bar is written last, as
+    a day is scored before its bar is downloaded the next morning. A new table,
+    or one that predates the bar trigger, is filled from the rows saved so far,
+    which is also how scores saved before SPY_stock_data existed get joined.
+    download_spy_stocks calls it again once it has created SPY_stock_data.
+    Returns whether the triggers are in place.
+    """
+    conn = get_connection()
+    tables = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    triggers = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+
+    with conn:
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS scored_stock_data (
+            Date TEXT NOT NULL,
+            Symbol TEXT NOT NULL,
+            Close FLOAT,
+            technical_analysis_score INTEGER NOT NULL,
+            Stock_Row INTEGER NOT NULL,  -- rowid in SPY_stock_data, the order of a day's rows in the backtests
+            PRIMARY KEY (Date, Symbol)
+        ) WITHOUT ROWID
+        ''')
+        # Each trigger reads the other table, so neither is created before both tables exist
+        if not {'SPY_stock_data', 'technical_analysis_score'} <= tables:
+            return False
+        conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS scored_stock_data_insert AFTER INSERT ON technical_analysis_score
+        BEGIN
+            INSERT OR REPLACE INTO scored_stock_data (Date, Symbol, Close, technical_analysis_score, Stock_Row)
+            SELECT Date, Symbol, Close, NEW.technical_analysis_score, rowid FROM SPY_stock_data
+            WHERE Date = NEW.Timestamp AND Symbol = NEW.Symbol;
+        END
+        ''')
+        conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS scored_stock_data_bar_insert AFTER INSERT ON SPY_stock_data
+        BEGIN
+            INSERT OR REPLACE INTO scored_stock_data (Date, Symbol, Close, technical_analysis_score, Stock_Row)
+            SELECT NEW.Date, NEW.Symbol, NEW.Close, technical_analysis_score, NEW.rowid FROM technical_analysis_score
+            WHERE Timestamp = NEW.Date AND Symbol = NEW.Symbol;
+        END
+        ''')
+        if 'scored_stock_data' not in tables or 'scored_stock_data_bar_insert' not in triggers:
+            conn.execute('''
+            INSERT OR REPLACE INTO scored_stock_data (Date, Symbol, Close, technical_analysis_score, Stock_Row)
+            SELECT s.Date, s.Symbol, s.Close, t.technical_analysis_score, s.rowid
+            FROM technical_analysis_score t JOIN SPY_stock_data s ON s.Date = t.Timestamp AND s.Symbol = t.Symbol
+            ''')
+    return True
+
+def get_scored_stock_data(start_date, end_date, by_symbol=False):
+    """The scored price rows from start_date to end_date, the rows the backtests used to merge.
+
+    Each day's rows come in SPY_stock_data order, like the test backtest's
+    merge, or with by_symbol=True in Symbol order, like the training one's.
+    """
+    # The tables are set up once per process, not on every read
+    if (os.path.abspath(DB_NAME), os.getpid()) not in _created_tables:
+        create_table()
+    return pd.read_sql(f'''
+    SELECT Date, Symbol, Close, technical_analysis_score FROM scored_stock_data
+    WHERE Date >= ? AND Date <= ? ORDER BY Date, {'Symbol' if by_symbol else 'Stock_Row'}
+    ''', get_connection(), params=(start_date, end_date))
 
 def save_to_sqlite(Symbol, score, rank, analysis, end_date):
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
 
     # Insert the data or do nothing if Timestamp and Symbol already exist
@@ -46,5 +249,384 @@ def save_to_sqlite(Symbol, score, rank, analysis, end_date):
     ''', (Symbol, score, rank, analysis, end_date))
 
     conn.commit()
-    conn.close()
+    _scores_written()
+
+def _scores_written():
+    global _score_writes
+    _score_writes += 1
+
+
+def save_many_to_sqlite(df_results, replace=False):
+    """Write a frame of Symbol/Score/Rank/Analysis/Timestamp rows in a single transaction.
+
+    Rows with a Signals vector save it in the strategy columns and leave
+    Analysis empty; get_scores rebuilds the text from the message tables of
+    vectorized_scoring.
+    """
+    conn = get_connection()
+    # Rebuilding scores overwrites the saved rows instead of keeping the old ones
+    verb = 'INSERT OR REPLACE' if replace else 'INSERT OR IGNORE'
+    columns = signal_columns()
+    if 'Signals' not in df_results:
+        df_results = df_results.assign(Signals=None)
+    rows = df_results[['Symbol', 'Score', 'Rank', 'Analysis', 'Timestamp', 'Signals']].itertuples(index=False,
+                                                                                                 name=None)
+    empty = (None,) * len(columns)
+
+    with timer('write'), conn:
+        conn.executemany(f'''
+        {verb} INTO technical_analysis_score 
+        (Symbol, technical_analysis_score, Rank, Analysis, Timestamp, {', '.join(columns)})
+        VALUES (?, ?, ?, ?, ?{', ?' * len(columns)})
+        ''', ((Symbol, int(score), int(rank), '' if signals else analysis, timestamp) + (signals or empty)
+              for Symbol, score, rank, analysis, timestamp, signals in rows))
+    _scores_written()
+    count('rows_written', len(df_results))
+
+def get_scores(start_date, end_date, symbols=None):
+    """The saved scores from start_date to end_date with their Analysis text and signal columns."""
+    from vectorized_scoring import analysis_from_signals
+    columns = signal_columns()
+    query = f'''
+    SELECT Symbol, technical_analysis_score AS Score, Rank, Analysis, Timestamp, {', '.join(columns)}
+    FROM technical_analysis_score WHERE Timestamp >= ? AND Timestamp <= ?'''
+    params = [start_date, end_date]
+    if symbols is not None:
+        query += f" AND Symbol IN ({', '.join('?' * len(symbols))})"
+        params.extend(symbols)
+    df = pd.read_sql(query + ' ORDER BY Timestamp, Rank', get_connection(), params=params)
+
+    compact = (df['Analysis'] == '') & df[columns[0]].notna()
+    if compact.any():
+        signals = df.loc[compact, columns].astype(int).itertuples(index=False, name=None)
+        analysis = {}
+        df.loc[compact, 'Analysis'] = [
+            analysis.setdefault((Symbol, vector), analysis_from_signals(Symbol, vector))
+            for Symbol, vector in zip(df.loc[compact, 'Symbol'], signals)]
+    return df
+
+def compact_scores():
+    """Replace the Analysis text of rows saved before the signal columns with their signal vector.
+
+    Rows whose text does not match the message tables keep it. Returns the number of rows compacted.
+    """
+    from vectorized_scoring import parse_analysis
+    create_table()
+    conn = get_connection()
+    columns = signal_columns()
+    rows = conn.execute(f"SELECT id, Analysis FROM technical_analysis_score "
+                        f"WHERE {columns[0]} IS NULL AND Analysis != ''").fetchall()
+    updates = [(*signals, id) for id, signals in ((id, parse_analysis(analysis)) for id, analysis in rows)
+               if signals is not None]
+
+    with conn:
+        conn.executemany(f'''
+        UPDATE technical_analysis_score SET Analysis = '', {', '.join(f'{column} = ?' for column in columns)}
+        WHERE id = ?
+        ''', updates)
+    _scores_written()
+    return len(updates)
+
+# Read API of the saved scores for dashboards. Each query is answered from one
+# of the covering indexes, and its result is kept in an LRU cache until the
+# scores change: a write from this process bumps _score_writes, a commit from
+# any other connection changes PRAGMA data_version.
+
+@functools.lru_cache(maxsize=256)
+def _read_scores(version, query, params):
+    return pd.read_sql(query, get_connection(), params=params)
+
+def _query_scores(query, params):
+    version = (os.path.abspath(DB_NAME), threading.get_ident(),
+               get_connection().execute('PRAGMA data_version').fetchone()[0], _score_writes)
+    # A copy, so callers cannot change the cached frame
+    return _read_scores(version, query, tuple(params)).copy()
+
+def get_top_scores(date, k=10, by='Rank', bottom=False):
+    """The k best scored symbols of date, or the k worst with bottom=True, ordered by Rank or Score.
+
+    Ties are ordered by Symbol in both lists.
+    """
+    column = {'Rank': 'Rank', 'Score': 'technical_analysis_score'}[by]
+    order = 'DESC' if (by == 'Score') != bottom else 'ASC'
+    return _query_scores(f'''
+    SELECT Symbol, technical_analysis_score AS Score, Rank FROM technical_analysis_score
+    WHERE Timestamp = ? ORDER BY {column} {order}, Symbol LIMIT ?
+    ''', (date, k))
+
+def get_score_history(Symbol, start_date, end_date):
+    """Score and Rank of Symbol on every saved day from start_date to end_date."""
+    return _query_scores('''
+    SELECT Timestamp, technical_analysis_score AS Score, Rank FROM technical_analysis_score
+    WHERE Symbol = ? AND Timestamp >= ? AND Timestamp <= ? ORDER BY Timestamp
+    ''', (Symbol, start_date, end_date))
+
+def get_score_distribution(start_date, end_date):
+    """How many symbols got each score on every saved day from start_date to end_date."""
+    return _query_scores('''
+    SELECT Timestamp, technical_analysis_score AS Score, COUNT(*) AS Symbols FROM technical_analysis_score
+    WHERE Timestamp >= ? AND Timestamp <= ? GROUP BY Timestamp, technical_analysis_score
+    ORDER BY Timestamp, Score
+    ''', (start_date, end_date))
+
+class ScoreWriter:
+    """Bulk writer of score frames, each saved by save_many_to_sqlite in one transaction.
+
+    With background=True the frames are written by a thread of their own so that
+    scoring the next day does not wait on the disk; close() waits for the
+    pending frames and re-raises the first error the thread hit.
+    """
+
+    def __init__(self, background=False, replace=False, max_pending=16):
+        self.replace = replace
+        self.error = None
+        self.thread = None
+        if background:
+            self.pending = queue.Queue(max_pending)
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def write(self, df_results):
+        if self.thread is None:
+            save_many_to_sqlite(df_results, self.replace)
+        else:
+            if self.error is not None:
+                raise self.error
+            self.pending.put(df_results)
+
+    def _run(self):
+        while True:
+            df_results = self.pending.get()
+            if df_results is None:
+                return
+            if self.error is None:
+                try:
+                    save_many_to_sqlite(df_results, self.replace)
+                except Exception as e:
+                    self.error = e
+
+    def close(self):
+        if self.thread is not None:
+            self.pending.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            self.close()
+        except Exception:
+            # An exception leaving the with block is the one reported
+            if exc_info[0] is None:
+                raise
+
+def get_stock_data_after_dates(after_dates, end_time):
+    """Fetch each symbol's bars newer than after_dates[Symbol] up to end_time, oldest first.
+
+    Symbols missing from after_dates get all their bars. Every symbol is read
+    off the (Symbol, Date) index from its own date on, so one symbol with an
+    old date does not make the others re-read their bars since then.
+    """
+    conn = get_connection()
+    columns = "Date, Symbol, Open, High, Low, Close, Volume"
+    symbols = [Symbol for Symbol, in conn.execute("SELECT DISTINCT Symbol FROM SPY_stock_data")]
+    known = [(Symbol, after_dates[Symbol]) for Symbol in symbols if Symbol in after_dates]
+    missing = [Symbol for Symbol in symbols if Symbol not in after_dates]
+    queries, params = [], []
+    if known:
+        queries.append(f"""
+        SELECT s.Date, s.Symbol, s.Open, s.High, s.Low, s.Close, s.Volume
+        FROM (VALUES {', '.join(['(?, ?)'] * len(known))}) AS after_dates
+        JOIN SPY_stock_data s ON s.Symbol = after_dates.column1 AND s.Date > after_dates.column2 AND s.Date <= ?""")
+        params.extend(itertools.chain.from_iterable(known))
+        params.append(end_time)
+    if missing:
+        queries.append(f"SELECT {columns} FROM SPY_stock_data "
+                       f"WHERE Date <= ? AND Symbol IN ({', '.join('?' * len(missing))})")
+        params.append(end_time)
+        params.extend(missing)
+    if not queries:
+        return pd.DataFrame(columns=columns.split(', '))
+    return pd.read_sql(' UNION ALL '.join(queries) + " ORDER BY Date", conn, params=params)
+
+def create_indicator_state_table():
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    # One pickled incremental_scoring.SymbolState per symbol, as of its latest bar
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS indicator_state (
+        Symbol TEXT PRIMARY KEY,
+        Date TEXT NOT NULL,
+        State BLOB NOT NULL
+    )
+    ''')
+
+    conn.commit()
+
+def load_indicator_states():
+    create_indicator_state_table()
+    conn = get_connection()
+    rows = conn.execute('SELECT Symbol, State FROM indicator_state').fetchall()
+    return {Symbol: pickle.loads(state) for Symbol, state in rows}
+
+def save_indicator_states(states):
+    create_indicator_state_table()
+    conn = get_connection()
+
+    with conn:
+        conn.executemany('''
+        INSERT OR REPLACE INTO indicator_state (Symbol, Date, State) VALUES (?, ?, ?)
+        ''', ((Symbol, state.date, pickle.dumps(state)) for Symbol, state in states.items()))
+
+def create_backtest_state_table():
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    # Pickled backtest_engine.Portfolio of a backtest as of its last simulated day
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS backtest_state (
+        Name TEXT PRIMARY KEY,
+        Params TEXT NOT NULL,
+        Date TEXT,
+        State BLOB NOT NULL
+    )
+    ''')
+
+    conn.commit()
+
+def load_backtest_state(name, params):
+    """The saved portfolio of the backtest name, or None if there is none for these params."""
+    create_backtest_state_table()
+    row = get_connection().execute('SELECT Params, State FROM backtest_state WHERE Name = ?', (name,)).fetchone()
+    if row is None or row[0] != params:
+        return None
+    return pickle.loads(row[1])
+
+def save_backtest_state(name, params, portfolio):
+    create_backtest_state_table()
+    conn = get_connection()
+
+    with conn:
+        conn.execute('''
+        INSERT OR REPLACE INTO backtest_state (Name, Params, Date, State) VALUES (?, ?, ?, ?)
+        ''', (name, params, portfolio.date, pickle.dumps(portfolio)))
+
+def create_ticker_metadata_table():
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    # Slow-moving yfinance Ticker.info fields, refreshed by download_spy_stocks once they are stale
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS ticker_metadata (
+        Symbol TEXT PRIMARY KEY,
+        Market_Cap FLOAT,
+        Float_Shares FLOAT,
+        Updated TEXT NOT NULL
+    )
+    ''')
+
+    conn.commit()
+
+def load_ticker_metadata(updated_after):
+    """Cached {Symbol: {'marketCap': ..., 'floatShares': ...}} refreshed after updated_after, missing fields omitted."""
+    create_ticker_metadata_table()
+    rows = get_connection().execute(
+        'SELECT Symbol, Market_Cap, Float_Shares FROM ticker_metadata WHERE Updated > ?', (updated_after,)).fetchall()
+    return {Symbol: {key: value for key, value in (('marketCap', market_cap), ('floatShares', float_shares))
+                     if value is not None}
+            for Symbol, market_cap, float_shares in rows}
+
+def save_ticker_metadata(metadata, updated):
+    create_ticker_metadata_table()
+    conn = get_connection()
+
+    with conn:
+        conn.executemany('''
+        INSERT OR REPLACE INTO ticker_metadata (Symbol, Market_Cap, Float_Shares, Updated) VALUES (?, ?, ?, ?)
+        ''', ((Symbol, info.get('marketCap'), info.get('floatShares'), updated) for Symbol, info in metadata.items()))
+
+def create_strategy_result_table():
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    # Memoized backtrader result of the latest bars scored, see score_cache. Score is NULL when the strategy raised.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS strategy_result (
+        Symbol TEXT NOT NULL,
+        Strategy TEXT NOT NULL,
+        Params TEXT NOT NULL,
+        Fingerprint TEXT NOT NULL,
+        Date TEXT NOT NULL,
+        Score INTEGER,
+        Message TEXT,
+        Used TEXT NOT NULL,
+        PRIMARY KEY (Symbol, Strategy, Params)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_strategy_result_used ON strategy_result (Used)')
+
+    conn.commit()
+
+def load_strategy_results(Symbol, fingerprint):
+    """{(Strategy, Params): (Score, Message)} saved for these bars of Symbol."""
+    rows = get_connection().execute(
+        'SELECT Strategy, Params, Score, Message FROM strategy_result WHERE Symbol = ? AND Fingerprint = ?',
+        (Symbol, fingerprint)).fetchall()
+    return {(strategy, params): (score, message) for strategy, params, score, message in rows}
+
+def save_strategy_results(rows, used, max_rows=None):
+    """Save (Symbol, Fingerprint, Strategy, Params, Date, Score, Message) rows as used at used.
+
+    A row replaces the one saved for an earlier fingerprint of the same Symbol, Strategy and Params.
+
+    With max_rows, the rows least recently used are then evicted down to about that many.
+    """
+    conn = get_connection()
+
+    with conn:
+        conn.executemany('''
+        INSERT OR REPLACE INTO strategy_result (Symbol, Fingerprint, Strategy, Params, Date, Score, Message, Used)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (row + (used,) for row in rows))
+        if max_rows is not None:
+            conn.execute('''
+            DELETE FROM strategy_result
+            WHERE Used < (SELECT Used FROM strategy_result ORDER BY Used DESC LIMIT 1 OFFSET ?)
+            ''', (max_rows,))
+
+def create_run_metrics_table():
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    # The metrics.Metrics summary of each run, one row per stage and counter
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS run_metrics (
+        Run TEXT NOT NULL,  -- unique per run
+        Started TEXT,
+        Stage TEXT NOT NULL,
+        Seconds FLOAT,  -- NULL for counters
+        Calls INTEGER NOT NULL,  -- the count of a counter
+        RSS_Growth_MB FLOAT,  -- how far the stage raised the process's peak RSS
+        PRIMARY KEY (Run, Stage)
+    )
+    ''')
+
+    conn.commit()
+
+def save_run_metrics(summary):
+    """Save a metrics.Metrics summary into run_metrics, one row per stage and counter."""
+    create_run_metrics_table()
+    conn = get_connection()
 
+    with conn:
+        run, started = summary['run'], summary['started']
+        conn.executemany('''
+        INSERT INTO run_metrics (Run, Started, Stage, Seconds, Calls, RSS_Growth_MB) VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(run, started, name, stage['seconds'], stage['calls'], stage['rss_growth_mb'])
+              for name, stage in summary['stages'].items()]
+            + [(run, started, name, None, value, None) for name, value in summary['counters'].items()])
@@ -1,10 +1,144 @@
-import yfinance as yf
-import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import pandas as pd
+from connect_to_sqlite import create_indexes, create_scored_stock_data_table, get_connection
+from connect_to_sqlite import load_ticker_metadata, save_ticker_metadata
+from metrics import count, timer
+
+# Symbols are fetched in multi-ticker batches on a small thread pool and each
+# batch is written to the database as soon as it arrives. Providers only need
+# download(symbols, start, end) returning {symbol: DataFrame of daily bars} and
+# info(symbol) returning the ticker's metadata dict.
+
+OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+
+
+class YahooProvider:
+    def download(self, symbols, start, end):
+        import yfinance as yf
+        data = yf.download(symbols, start=start, end=end, interval="1d", group_by="ticker",
+                           threads=False, progress=False)
+        bars = {}
+        for symbol in symbols:
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(0):
+                    continue
+                frame = data[symbol]
+            else:
+                frame = data
+            # Tickers of a batch share one date index, drop the dates this one has no bar for
+            frame = frame[OHLCV].dropna(how="all")
+            if not frame.empty:
+                bars[symbol] = frame
+        return bars
+
+    def info(self, symbol):
+        import yfinance as yf
+        return yf.Ticker(symbol).info
+
+
+class FakeProvider:
+    """Serves bars from a DataFrame with Date, Symbol and OHLCV columns, sleeping latency seconds per request."""
+
+    def __init__(self, history, info=None, latency=0.0, failures=0):
+        self.history = history.assign(Date=pd.to_datetime(history["Date"]))
+        self.metadata = info or {}
+        self.latency = latency
+        # The first `failures` downloads raise, to exercise the retries
+        self.failures = failures
+
+    def download(self, symbols, start, end):
+        time.sleep(self.latency)
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("injected failure")
+        rows = self.history[self.history["Symbol"].isin(symbols)
+                            & (self.history["Date"] >= pd.Timestamp(start))
+                            & (self.history["Date"] < pd.Timestamp(end))]
+        return {symbol: frame.set_index("Date")[OHLCV] for symbol, frame in rows.groupby("Symbol")}
+
+    def info(self, symbol):
+        time.sleep(self.latency)
+        return self.metadata.get(symbol, {})
+
+
+def with_retry(call, retries=3, backoff=1.0):
+    """Run call(), retrying failures with exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            return call()
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
 
-def download_spy_stocks():
-    conn = sqlite3.connect('db.sqlite3')
-    # conn = sqlite3.connect('tmp/db.sqlite3')
+
+def batches(symbol_list, start_dates, batch_size):
+    """Group the symbols sharing a start date into batches of at most batch_size."""
+    by_start = {}
+    for symbol, company_name in symbol_list:
+        by_start.setdefault(start_dates[symbol], []).append((symbol, company_name))
+    for start_date, group in by_start.items():
+        for i in range(0, len(group), batch_size):
+            yield start_date, group[i:i + batch_size]
+
+
+def download_batch(provider, batch, start_date, end_date, retries, backoff, metadata):
+    """Download one batch and shape each symbol's bars into SPY_stock_data rows.
+
+    Returns (symbol, rows, info) tuples, info being the freshly fetched metadata
+    of the symbols missing from the metadata cache and None for the others.
+    """
+    symbols = [symbol for symbol, company_name in batch]
+    with timer('download'):
+        bars = with_retry(lambda: provider.download(symbols, start_date, end_date), retries, backoff)
+    results = []
+    for symbol, company_name in batch:
+        stock_data = bars.get(symbol)
+        if stock_data is None or stock_data.empty:
+            continue
+        stock_data = stock_data.reset_index()
+        stock_data["Date"] = pd.to_datetime(stock_data["Date"]).dt.strftime('%Y-%m-%d')
+        stock_data["Market"] = "US"
+        stock_data["Symbol"] = symbol
+        stock_data["Company_name"] = company_name  # Add Company_name column
+        stock_data = stock_data[
+            ["Date", "Market", "Symbol", "Company_name", "Open", "High", "Low", "Close", "Volume"]]
+
+        fetched = None
+        if symbol in metadata:
+            info = metadata[symbol]
+        else:
+            # One request for both fields, kept only if the cache has no fresh copy
+            try:
+                with timer('download.info'):
+                    info = with_retry(lambda: provider.info(symbol), retries, backoff)
+            except Exception as e:
+                # The bars are still saved, without the metadata and without caching its absence
+                print(f"Error fetching info for {symbol}: {str(e)}")
+                info = {}
+            else:
+                fetched = {key: info[key] for key in ('marketCap', 'floatShares') if info.get(key) is not None}
+                info = fetched
+        stock_data['Market_Cap'] = info.get('marketCap')  # None if data is not available
+        if 'floatShares' in info:
+            stock_data['Turnover_Rate'] = 100 * stock_data["Volume"] / info['floatShares']
+        else:
+            stock_data['Turnover_Rate'] = None
+        results.append((symbol, stock_data, fetched))
+    return results
+
+
+def download_spy_stocks(provider=None, batch_size=50, workers=4, retries=3, backoff=1.0,
+                        metadata_ttl=pd.Timedelta(days=1), on_saved=None, end_date=None):
+    """Append the bars since each symbol's latest saved date, reusing ticker metadata younger than metadata_ttl.
+
+    on_saved(symbol) is called once the new bars of a symbol are committed.
+    end_date, today by default, is the first day not downloaded.
+    """
+    provider = provider or YahooProvider()
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute("SELECT symbol, company_name FROM spy_holdings_symbols")
     symbols_with_names = cursor.fetchall()
@@ -29,43 +163,52 @@ def download_spy_stocks():
         )
     """
     conn.execute(create_table_query)
+    create_indexes(conn)
+    # Joins the bars saved from now on with their scores
+    create_scored_stock_data_table()
 
-    # Iterate through the list of stock symbols and update the table
-    for symbol, company_name in symbol_list:
+    # Each symbol continues from the day after its latest saved bar
+    cursor.execute(f"SELECT Symbol, MAX(Date) FROM {table_name} GROUP BY Symbol")
+    max_dates = dict(cursor.fetchall())
+    now = pd.Timestamp.now()
+    end = pd.Timestamp(end_date) if end_date is not None else now
+    default_start = (end - pd.DateOffset(730)).strftime('%Y-%m-%d')
+    start_dates = {symbol: (pd.Timestamp(max_dates[symbol]) + pd.DateOffset(1)).strftime('%Y-%m-%d')
+                   if max_dates.get(symbol) is not None else default_start
+                   for symbol, company_name in symbol_list}
+    end_date = end.strftime('%Y-%m-%d')
+    metadata = load_ticker_metadata((now - metadata_ttl).isoformat())
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(download_batch, provider, batch, start_date, end_date, retries, backoff,
+                               metadata): batch
+                   for start_date, batch in batches(symbol_list, start_dates, batch_size)
+                   if start_date < end_date}
+        # Write each batch as it completes, from this thread only
         try:
-            cursor.execute(f"SELECT MAX(Date) FROM {table_name} WHERE Symbol = ?", (symbol,))
-            max_date = cursor.fetchone()[0]
-            if max_date is not None:
-                start_date = (pd.Timestamp(max_date) + pd.DateOffset(1)).strftime('%Y-%m-%d')
-                # start_date = (pd.Timestamp.now() - pd.DateOffset(1)).strftime('%Y-%m-%d')
-            else:
-                start_date = (pd.Timestamp.now() - pd.DateOffset(730)).strftime('%Y-%m-%d')
-            end_date = pd.Timestamp.now().strftime('%Y-%m-%d')
-            stock_data = yf.download(symbol, start=start_date, end=end_date, interval="1d")
-
-            if not stock_data.empty:
-                stock_data.reset_index(inplace=True)
-                stock_data["Date"] = stock_data["Date"].dt.strftime('%Y-%m-%d')
-                stock_data["Market"] = "US"
-                stock_data["Symbol"] = symbol
-                stock_data["Company_name"] = company_name  # Add Company_name column
-                stock_data = stock_data[
-                    ["Date", "Market", "Symbol", "Company_name", "Open", "High", "Low", "Close", "Volume"]]
-
-                if 'marketCap' in yf.Ticker(symbol).info:
-                    market_cap = yf.Ticker(symbol).info['marketCap']
-                else:
-                    market_cap = None  # Set marketCap to None if data is not available
-                stock_data['Market_Cap'] = market_cap
-                if 'floatShares' in yf.Ticker(symbol).info:
-                    stock_data['Turnover_Rate'] = 100 * stock_data["Volume"] / yf.Ticker(symbol).info['floatShares']
-                else:
-                    stock_data['Turnover_Rate'] = None
-                stock_data.to_sql(table_name, conn, if_exists="append", index=False)
-        except Exception as e:
-            print(f"Error downloading data for {symbol}: {str(e)}")
-            pass
-    # Close the database connection
-    conn.close()
+            for future in as_completed(futures):
+                try:
+                    results = future.result()
+                except Exception as e:
+                    symbols = ', '.join(symbol for symbol, _ in futures[future])
+                    print(f"Error downloading data for {symbols}: {str(e)}")
+                    continue
+                for symbol, stock_data, fetched in results:
+                    try:
+                        with timer('download.write'):
+                            stock_data.to_sql(table_name, conn, if_exists="append", index=False)
+                        count('download.rows', len(stock_data))
+                    except Exception as e:
+                        print(f"Error saving data for {symbol}: {str(e)}")
+                        continue
+                    if on_saved is not None:
+                        on_saved(symbol)
+                save_ticker_metadata({symbol: fetched for symbol, stock_data, fetched in results
+                                      if fetched is not None}, now.isoformat())
+        except BaseException:
+            # Drop the batches not started yet, e.g. when on_saved raised
+            for future in futures:
+                future.cancel()
+            raise
 
 # download_spy_stocks()
@@ -0,0 +1,519 @@
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from connect_to_sqlite import get_stock_data_after_dates, load_indicator_states
+from strategy_specs import STRATEGIES, strategy_params
+from vectorized_scoring import FAILED, daily_results
+
+# Bar by bar version of the 20 strategies. Each symbol keeps the running state
+# of its indicators between runs, so a new trading day only costs one update
+# per strategy. Every update performs the same floating point operations as
+# vectorized_scoring and returns the same signal codes.
+
+NAN = float('nan')
+
+
+def _divide(num, den):
+    return num / den if den != 0 else NAN
+
+
+def _zero_division(num, den):
+    return den == 0 and not math.isnan(num)
+
+
+def _first(conditions):
+    for code, condition in enumerate(conditions):
+        if condition:
+            return code
+    return len(conditions)
+
+
+class _Sma:
+    def __init__(self, period):
+        self.period = period
+        self.window = deque(maxlen=period)
+
+    def __call__(self, value):
+        self.window.append(value)
+        if len(self.window) < self.period:
+            return NAN
+        return math.fsum(self.window) / self.period
+
+
+class _Smoothing:
+    def __init__(self, period, alpha):
+        self.seed = _Sma(period)
+        self.alpha = alpha
+        self.alpha1 = 1.0 - alpha
+        self.value = NAN
+
+    def __call__(self, value):
+        seed = self.seed(value)
+        if math.isnan(self.value):
+            self.value = seed
+        else:
+            self.value = self.value * self.alpha1 + value * self.alpha
+        return self.value
+
+
+def _ema(period):
+    return _Smoothing(period, 2.0 / (1.0 + period))
+
+
+def _smma(period):
+    return _Smoothing(period, 1.0 / period)
+
+
+class _Extreme:
+    def __init__(self, period, func):
+        self.func = func
+        self.window = deque(maxlen=period)
+
+    def __call__(self, value):
+        self.window.append(value)
+        return self.func(self.window) if len(self.window) == self.window.maxlen else NAN
+
+
+class _Lag:
+    def __init__(self, period):
+        self.window = deque(maxlen=period + 1)
+
+    def __call__(self, value):
+        self.window.append(value)
+        return self.window[0] if len(self.window) == self.window.maxlen else NAN
+
+
+class _Trix:
+    def __init__(self, period):
+        self.emas = [_ema(period), _ema(period), _ema(period)]
+        self.prev = NAN
+
+    def __call__(self, value):
+        for ema in self.emas:
+            value = ema(value)
+        prev, self.prev = self.prev, value
+        return 100.0 * (_divide(value, prev) - 1.0), _zero_division(value, prev)
+
+
+class _Bollinger:
+    def __init__(self, period, devfactor):
+        self.devfactor = devfactor
+        self.mid = _Sma(period)
+        self.meansq = _Sma(period)
+
+    def __call__(self, value):
+        mid = self.mid(value)
+        stddev = self.devfactor * pow(abs(self.meansq(pow(value, 2)) - pow(mid, 2)), 0.5)
+        return mid + stddev, mid - stddev
+
+
+class _StrategyState:
+    minperiod = 1
+
+    def __init__(self, p):
+        self.p = p
+        self.bars = 0
+        self.failed = False
+
+    def update(self, open, high, low, close, volume):
+        self.bars += 1
+        code = self.next(open, high, low, close, volume)
+        if self.failed or self.bars < self.minperiod:
+            return FAILED
+        return code
+
+
+class _MovingAverageCrossoverState(_StrategyState):
+    def __init__(self, p):
+        super().__init__(p)
+        self.minperiod = max(p['short_window'], p['long_window']) + 1
+        self.short_mavg = _Sma(p['short_window'])
+        self.long_mavg = _Sma(p['long_window'])
+
+    def next(self, open, high, low, close, volume):
+        return _first([self.short_mavg(close) > self.long_mavg(close)])
+
+
+class _RsiState(_StrategyState):
+    def __init__(self, p):
+        super().__init__(p)
+        self.minperiod = p['rsi_period'] + 1
+        self.prev_close = _Lag(1)
+        self.maup = _smma(p['rsi_period'])
+        self.madown = _smma(p['rsi_period'])
+
+    def next(self, open, high, low, close, volume):
+        diff = close - self.prev_close(close)
+        maup = self.maup(max(diff, 0.0))
+        madown = self.madown(max(-diff, 0.0))
+        self.failed |= _zero_division(maup, madown)
+        rsi = 100.0 - 100.0 / (1.0 + _divide(maup, madown))
+        return _first([rsi < 30, rsi > 70])
+
+
+class _BollingerBandsState(_StrategyState):
+    def __init__(self, p):
+        super().__init__(p)
+        self.minperiod = p['period']
+        self.bbands = _Bollinger(p['period'], p['devfactor'])
+
+    def next(self, open, high, low, close, volume):
+        top, bot = self.bbands(close)
+        return _first([close > bot, close < top])
+
+
+class _BollingerBandsRTMState(_BollingerBandsState):
+    def next(self, open, high, low, close, volume):
+        top, bot = self.bbands(close)
+        return _first([close < bot, close > top])
+
+
+class _BollingerBandsBreakoutState(_BollingerBandsState):
+    def next(self, open, high, low, close, volume):
+        top, bot = self.bbands(close)
+        return _first([close > top, close < bot])
+
+
+class _CommodityChannelIndexState(_StrategyState):
+    def __init__(self, p):
+        super().__init__(p)
+        self.minperiod = 2 * p['period'] - 1
+        self.tpmean = _Sma(p['period'])
+        self.meandev = _Sma(p['period'])
+
+    def next(self, open, high, low, close, volume):
+        tp = (high + low + close) / 3.0
+        dev = tp - self.tpmean(tp)
+        den = 0.015 * self.meandev(abs(dev))
+        self.failed |= _zero_division(dev, den)
+        cci = _divide(dev, den)
+        return _first([cci < -100, cci > 100])
+
+
+class _TripleExponentialMovingAverageState(_StrategyState):
+    def __init__(self, p):
+        super().__init__(p)
+        self.minperiod = 3 * p['period'] - 1
+        self.trix = _Trix(p['period'])
+        self.prev = NAN
+
+    def next(self, open, high, low, close, volume):
+        trix, zero_division = self.trix(close)
+        self.failed |= zero_division
+        prev, self.prev = self.prev, trix
+        return _first([trix > prev, trix < prev])
+
+
+class _RateOfChangeState(_StrategyState):
+    def __init__(self, p):
+        super().__init__(p)
+        self.minperiod = p['period'] + 1
+        self.dperiod = _Lag(p['period'])
+
+    def next(self, open, high, low, close, volume):
+        dperiod = self.dperiod(close)
+        change = close - dperiod
+        self.failed |= _zero_division(change, dperiod)
+        roc = _divide(change, dperiod)
+        return _first([roc > 0, roc < 0])
+
+
+class _ParabolicSARState(_StrategyState):
+    minperiod = 2
+
+    def __init__(self, p):
+        super().__init__(p)
+        self.prev_bar = None
+
+    def next(self, open, high, low, close, volume):
+        af0, afmax = self.p['af'], self.p['afmax']
+        psar = NAN
+        if self.prev_bar is not None:
+            prev_high, prev_low, prev_close = self.prev_bar
+            if self.bars == 2:
+                # State after ParabolicSAR.nextstart on the second bar
+                uptrend = close >= prev_close
+                self.tr = not uptrend
+                self.ep = prev_low if uptrend else prev_high
+                self.sar = (high + low) / 2.0
+                self.af = af0
+            tr, sar, ep, af = self.tr, self.sar, self.ep, self.af
+            if (tr and sar >= low) or (not tr and sar <= high):
+                tr = not tr
+                sar = ep
+                ep = high if tr else low
+                af = af0
+            psar = sar
+
+            if (high > ep) if tr else (low < ep):
+                ep = high if tr else low
+                af = min(af + af0, afmax)
+
+            sar = sar + af * (ep - sar)
+            if tr and (sar > low or sar > prev_low):
+                sar = min(low, prev_low)
+            if not tr and (sar < high or sar < prev_high):
+                sar = max(high, prev_high)
+            self.tr, self.sar, self.ep, self.af = tr, sar, ep, af
+        self.prev_bar = (high, low, close)
+        return _first([close > psar])
+
+
+class _AwesomeOscillatorState(_StrategyState):
+    minperiod = 34
+
+    def __init__(self, p):
+        super().__init__(p)
+        self.fast = _Sma(5)
+        self.slow = _Sma(34)
+        self.prev = NAN
+
+    def next(self, open, high, low, close, volume):
+        median_price = (high + low) / 2.0
+        ao = self.fast(median_price) - self.slow(median_price)
+        prev, self.prev = self.prev, ao
+        return _first([ao > 0 and ao > prev, ao < 0 and ao < prev])
+
+
+class _HeikinAshiState(_StrategyState):
+    def __init__(self, p):
+        super().__init__(p)
+        self.prev = None
+
+    def next(self, open, high, low, close, volume):
+        ha_close = (open + high + low + close) / 4.0
+        if self.prev is None:
+            ha_open = (open + close) / 2.0
+        else:
+            ha_open = (self.prev[0] + self.prev[1]) / 2.0
+        self.prev = (ha_open, ha_close)
+        return _first([ha_close > ha_open, ha_close < ha_open])
+
+
+class _StochasticState(_StrategyState):
+    def __init__(self, p):
+        super().__init__(p)
+        self.minperiod = p['period'] + 4
+        self.highesthigh = _Extreme(p['period'], max)
+        self.lowestlow = _Extreme(p['period'], min)
+        self.perc_k = _Sma(3)
+        self.perc_d = _Sma(3)
+
+    def next(self, open, high, low, close, volume):
+        lowestlow = self.lowestlow(low)
+        knum = close - lowestlow
+        kden = self.highesthigh(high) - lowestlow
+        self.failed |= _zero_division(knum, kden)
+        perc_k = self.perc_k(100.0 * _divide(knum, kden))
+        perc_d = self.perc_d(perc_k)
+        upper, lower = self.p['upper'], self.p['lower']
+        return _first([perc_k > upper and perc_d > upper, perc_k < lower and perc_d < lower])
+
+
+class _TRIXCrossState(_StrategyState):
+    def __init__(self, p):
+        super().__init__(p)
+        self.minperiod = 4 * p['period'] - 2
+        self.trix = _Trix(p['period'])
+        self.signal = _smma(p['period'])
+
+    def next(self, open, high, low, close, volume):
+        trix, zero_division = self.trix(close)
+        self.failed |= zero_division
+        signal = self.signal(trix)
+        return _first([trix > signal, trix < signal])
+
+
+class _MomentumState(_StrategyState):
+    def __init__(self, p):
+        super().__init__(p)
+        self.minperiod = p['period'] + 1
+        self.dperiod = _Lag(p['period'])
+
+    def next(self, open, high, low, close, volume):
+        momentum = close - self.dperiod(close)
+        return _first([momentum > 0, momentum < 0])
+
+
+class _VolumeBreakoutState(_StrategyState):
+    def __init__(self, p):
+        super().__init__(p)
+        self.minperiod = p['sma_period']
+        self.sma = _Sma(p['sma_period'])
+        self.volume_sma = _Sma(p['sma_period'])
+
+    def next(self, open, high, low, close, volume):
+        sma = self.sma(close)
+        breakout = volume > self.volume_sma(volume) * self.p['volume_multiplier']
+        return _first([breakout and close > sma, breakout])
+
+
+class _VWAPState(_StrategyState):
+    def __init__(self, p):
+        super().__init__(p)
+        self.cum_vol = 0.0
+        self.cum_vol_price = 0.0
+
+    def next(self, open, high, low, close, volume):
+        self.cum_vol += volume
+        self.cum_vol_price += volume * close
+        self.failed |= _zero_division(self.cum_vol_price, self.cum_vol)
+        vwap = _divide(self.cum_vol_price, self.cum_vol)
+        return _first([close > vwap, close < vwap])
+
+
+class _MACDState(_StrategyState):
+    def __init__(self, p):
+        super().__init__(p)
+        self.minperiod = max(p['fast_length'], p['slow_length']) + p['signal_length'] - 1
+        self.fast = _ema(p['fast_length'])
+        self.slow = _ema(p['slow_length'])
+        self.signal = _ema(p['signal_length'])
+
+    def next(self, open, high, low, close, volume):
+        macd = self.fast(close) - self.slow(close)
+        signal = self.signal(macd)
+        return _first([macd > signal, macd < signal])
+
+
+class _OBVState(_StrategyState):
+    minperiod = 2
+
+    def __init__(self, p):
+        super().__init__(p)
+        self.prev_close = _Lag(1)
+        self.cumulative = 0.0
+        self.prev = NAN
+
+    def next(self, open, high, low, close, volume):
+        prev_close = self.prev_close(close)
+        obv = NAN
+        if not math.isnan(prev_close):
+            self.cumulative += volume if close > prev_close else -volume
+            obv = self.cumulative
+        prev, self.prev = self.prev, obv
+        return _first([obv > prev, obv < prev])
+
+
+class _SMAState(_StrategyState):
+    def __init__(self, p):
+        super().__init__(p)
+        self.minperiod = max(p['short_window'], p['long_window'])
+        self.short_sma = _Sma(p['short_window'])
+        self.long_sma = _Sma(p['long_window'])
+
+    def next(self, open, high, low, close, volume):
+        return _first([self.short_sma(close) > self.long_sma(close)])
+
+
+class _SupportResistanceState(_StrategyState):
+    def __init__(self, p):
+        super().__init__(p)
+        self.minperiod = p['support_resistance_period']
+        self.support = _Extreme(p['support_resistance_period'], min)
+        self.resistance = _Extreme(p['support_resistance_period'], max)
+
+    def next(self, open, high, low, close, volume):
+        support = self.support(low)
+        resistance = self.resistance(high)
+        return _first([close > resistance, close < support])
+
+
+# Strategy name -> state class
+INCREMENTAL_STRATEGIES = {
+    'MovingAverageCrossover': _MovingAverageCrossoverState,
+    'RsiStrategy': _RsiState,
+    'BollingerBandsStrategy': _BollingerBandsState,
+    'BollingerBandsRTM': _BollingerBandsRTMState,
+    'CommodityChannelIndex': _CommodityChannelIndexState,
+    'TripleExponentialMovingAverage': _TripleExponentialMovingAverageState,
+    'RateOfChange': _RateOfChangeState,
+    'ParabolicSARReversal': _ParabolicSARState,
+    'AwesomeOscillatorCross': _AwesomeOscillatorState,
+    'HeikinAshiTrend': _HeikinAshiState,
+    'BollingerBandsBreakout': _BollingerBandsBreakoutState,
+    'StochasticCross': _StochasticState,
+    'TRIXCross': _TRIXCrossState,
+    'Momentum': _MomentumState,
+    'VolumeBreakout': _VolumeBreakoutState,
+    'VWAPStrategy': _VWAPState,
+    'MACDStrategy': _MACDState,
+    'OBVStrategy': _OBVState,
+    'SMAStrategy': _SMAState,
+    'SupportResistanceStrategy': _SupportResistanceState,
+}
+
+
+def strategies_signature(strategies=STRATEGIES):
+    """Identify a strategy list and its params, a saved state is only valid for the same signature."""
+    return tuple((strategy.name, tuple(sorted(strategy_params(strategy).items())))
+                 for strategy in strategies)
+
+
+class SymbolState:
+    """Indicator state of every strategy for one symbol, as of its latest bar."""
+
+    def __init__(self, strategies=STRATEGIES):
+        self.signature = strategies_signature(strategies)
+        self.strategies = [INCREMENTAL_STRATEGIES[strategy.name](strategy_params(strategy))
+                           for strategy in strategies]
+        self.date = None
+        self.codes = None
+
+    def advance(self, date, open, high, low, close, volume):
+        """Feed one new bar and return the signal code of every strategy."""
+        self.date = date
+        self.codes = [strategy.update(open, high, low, close, volume) for strategy in self.strategies]
+        return self.codes
+
+
+def load_states(end_time, strategies=STRATEGIES):
+    """The saved indicator states valid for strategies as of end_time, and the bars that bring them up to it.
+
+    The bars of symbols without a valid saved state start from their first bar.
+    """
+    signature = strategies_signature(strategies)
+    states = {Symbol: state for Symbol, state in load_indicator_states().items()
+              if state.signature == signature and state.date <= end_time}
+    new_data = get_stock_data_after_dates({Symbol: state.date for Symbol, state in states.items()}, end_time)
+    return states, new_data
+
+
+def update_scores(start_date, end_date, strategies=STRATEGIES):
+    """Advance the saved indicator states through the new bars and score every day in the range.
+
+    Symbols without a valid saved state are replayed once from their first bar.
+    Returns the scores and the advanced states, which the caller saves with
+    save_indicator_states only once the scores are committed, so a failed
+    write leaves the states at the days last scored.
+    """
+    states, new_data = load_states(pd.Timestamp(end_date).strftime('%Y-%m-%d'), strategies)
+
+    symbols, bar_dates, bar_codes = [], [], []
+    for Symbol, rows in new_data.groupby('Symbol', sort=False):
+        state = states.get(Symbol)
+        dates, codes = [], []
+        if state is None:
+            state = states[Symbol] = SymbolState(strategies)
+        else:
+            dates.append(state.date)
+            codes.append(state.codes)
+        for date, open, high, low, close, volume in rows[['Date', 'Open', 'High', 'Low', 'Close', 'Volume']].itertuples(index=False, name=None):
+            dates.append(date)
+            codes.append(list(state.advance(date, float(open), float(high), float(low), float(close), float(volume))))
+        symbols.append(Symbol)
+        bar_dates.append(np.array(dates, dtype='datetime64[ns]'))
+        bar_codes.append(np.array(codes, dtype=np.int8))
+
+    # Symbols without new bars are still scored on their latest bar
+    updated = set(symbols)
+    for Symbol, state in states.items():
+        if Symbol not in updated:
+            symbols.append(Symbol)
+            bar_dates.append(np.array([state.date], dtype='datetime64[ns]'))
+            bar_codes.append(np.array([state.codes], dtype=np.int8))
+
+    return daily_results(symbols, bar_dates, bar_codes, start_date, end_date, strategies), states
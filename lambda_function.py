@@ -1,17 +1,48 @@
-from download_spy_stocks import download_spy_stocks
-from score_technical_analysis import calculate_total_score
 from datetime import datetime
 
+# Kept light to import: the pipeline modules (pandas and the data provider)
+# are imported by the first invocation, and nothing runs at import. backtrader
+# is only imported when the engine is 'backtrader'.
+
 def print_time():
     now = datetime.now()
     formatted_time = now.strftime("%Y-%m-%d %H:%M:%S")
     print(formatted_time)
 
-def lambda_handler():
+def lambda_handler(event=None, context=None):
+    """Download the new bars and score them, saving the stage timings to run_metrics.
+
+    event may give metrics_path, a JSON file for the timings, and engine, the
+    calculate_total_score engine. Symbols are scored while the others are
+    still downloading unless event has pipeline false or engine 'incremental'.
+    The price panel is kept between invocations of a warm container, and in
+    the PANEL_SNAPSHOT file if that is set.
+    """
+    event = event or {}
+    from connect_to_sqlite import save_run_metrics
+    from download_spy_stocks import download_spy_stocks
+    from metrics import Metrics, set_metrics, timer
+    from total_score import calculate_total_score
+
+    metrics = Metrics()
+    set_metrics(metrics)
+    engine = event.get('engine', 'backtrader')
     print_time()
-    download_spy_stocks()
-    calculate_total_score()
+    if event.get('pipeline', True) and engine != 'incremental':
+        from pipeline import run_pipeline
+        with timer('lambda_handler.pipeline'):
+            run_pipeline(engine=engine)
+    else:
+        with timer('lambda_handler.download'):
+            download_spy_stocks()
+        with timer('lambda_handler.score'):
+            calculate_total_score(engine=engine)
     print_time()
+    metrics.report()
+    save_run_metrics(metrics.summary())
+    if event.get('metrics_path'):
+        metrics.save_json(event['metrics_path'])
 
 
-lambda_handler()
\ No newline at end of file
+if __name__ == '__main__':
+    lambda_handler()
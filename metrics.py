@@ -0,0 +1,106 @@
+import json
+import resource
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+
+# Wall time, call counts and peak RSS growth per pipeline stage. The pipeline
+# reports into the current recorder through timer() and count(); set_metrics
+# swaps in another recorder, e.g. NullMetrics to switch the bookkeeping off.
+# Stages timed inside pool worker processes are not collected.
+#
+# The OS only keeps the high-water mark of a process's RSS, so a stage is
+# charged with how far it raised that mark: 0 for a stage that stayed below
+# the peak of an earlier one, however much it allocated, and nested or
+# overlapping stages are all charged with the growth while they ran. The peak
+# of the whole process is in the summary.
+
+
+def peak_rss_mb():
+    """High-water mark of this process's resident memory so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+class Metrics:
+    def __init__(self):
+        # started is only to the second, so two runs can share it; run tells them apart
+        self.run = uuid.uuid4().hex
+        self.started = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def timer(self, name):
+        peak = peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, peak_rss_mb() - peak)
+
+    def add(self, name, seconds, rss_growth_mb=0.0):
+        """Record one call of stage name, rss_growth_mb being how far it raised the peak RSS."""
+        with self.lock:
+            stage = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0, 'rss_growth_mb': 0.0})
+            stage['seconds'] += seconds
+            stage['calls'] += 1
+            stage['rss_growth_mb'] += rss_growth_mb
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self):
+        return {'run': self.run, 'started': self.started, 'peak_rss_mb': peak_rss_mb(), 'stages': self.stages,
+                'counters': self.counters}
+
+    def report(self):
+        """Print the stages, slowest first, the counters and the peak RSS."""
+        for name, stage in sorted(self.stages.items(), key=lambda item: -item[1]['seconds']):
+            print(f"{name:45s} {stage['seconds']:10.3f}s {stage['calls']:8d} calls "
+                  f"{stage['rss_growth_mb']:+9.1f} MB peak RSS growth")
+        for name, value in sorted(self.counters.items()):
+            print(f"{name:45s} {value}")
+        print(f"{'peak RSS':45s} {peak_rss_mb():.1f} MB")
+
+    def save_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+
+class NullMetrics(Metrics):
+    def timer(self, name):
+        return nullcontext()
+
+    def add(self, name, seconds, rss_growth_mb=0.0):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+def set_metrics(metrics):
+    """Make metrics the recorder of the stages that follow, returning the previous one."""
+    global _metrics
+    previous, _metrics = _metrics, metrics
+    return previous
+
+
+def timer(name):
+    return _metrics.timer(name)
+
+
+def count(name, n=1):
+    _metrics.count(name, n)
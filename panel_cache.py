@@ -0,0 +1,165 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+# In-process copy of SPY_stock_data as one contiguous array per field, indexed
+# by (symbol id, date index). The table only ever grows by appended rows, so a
+# refresh reads the rows with a rowid above the last one loaded instead of the
+# whole table.
+
+FIELDS = ('Open', 'High', 'Low', 'Close', 'Volume', 'Market_Cap', 'Turnover_Rate')
+
+
+class PricePanel:
+    def __init__(self, symbols, dates, open, high, low, close, volume, lengths):
+        self.symbols = symbols
+        self.dates = dates
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.lengths = lengths
+
+
+def _capacity(needed, current):
+    return current if needed <= current else max(needed, 2 * current)
+
+
+class PanelCache:
+    def __init__(self, db_name):
+        self.db_name = db_name
+        self.reset()
+
+    def reset(self):
+        self.rowid = 0
+        self.last_row = None
+        self.symbols = []
+        self.symbol_ids = {}
+        self.markets = []
+        self.company_names = []
+        self.dates = np.array([], dtype='datetime64[D]')
+        self.present = np.zeros((0, 0), dtype=bool)
+        self.fields = {field: np.zeros((0, 0)) for field in FIELDS}
+
+    def refresh(self, conn):
+        """Load the rows appended since the last refresh through conn, returning how many there were.
+
+        conn is a connection to db_name, e.g. the shared one of connect_to_sqlite.get_connection.
+        """
+        max_rowid = conn.execute('SELECT MAX(rowid) FROM SPY_stock_data').fetchone()[0] or 0
+        last_row = conn.execute('SELECT Date, Symbol FROM SPY_stock_data WHERE rowid = ?', (self.rowid,)).fetchone()
+        if max_rowid < self.rowid or (self.rowid and last_row != self.last_row):
+            # The table was rebuilt, start over
+            self.reset()
+        rows = pd.read_sql('SELECT rowid AS row_id, * FROM SPY_stock_data WHERE rowid > ? ORDER BY rowid',
+                           conn, params=(self.rowid,))
+        if rows.empty:
+            return 0
+        self.rowid = int(rows['row_id'].iloc[-1])
+        self.last_row = (rows['Date'].iloc[-1], rows['Symbol'].iloc[-1])
+
+        for Symbol, Market, Company_name in rows[['Symbol', 'Market', 'Company_name']].itertuples(index=False):
+            if Symbol not in self.symbol_ids:
+                self.symbol_ids[Symbol] = len(self.symbols)
+                self.symbols.append(Symbol)
+                self.markets.append(Market)
+                self.company_names.append(Company_name)
+        ids = rows['Symbol'].map(self.symbol_ids).to_numpy()
+        dates = pd.to_datetime(rows['Date']).to_numpy().astype('datetime64[D]')
+        self._reserve(np.union1d(self.dates, dates))
+
+        cols = np.searchsorted(self.dates, dates)
+        self.present[ids, cols] = True
+        for field in FIELDS:
+            self.fields[field][ids, cols] = pd.to_numeric(rows[field], errors='coerce').to_numpy(dtype=float)
+        return len(rows)
+
+    def _reserve(self, dates):
+        # Grow the arrays geometrically so daily appends rarely copy
+        rows, cols = self.present.shape
+        appended = np.array_equal(dates[:len(self.dates)], self.dates)
+        if appended and len(self.symbols) <= rows and len(dates) <= cols:
+            self.dates = dates
+            return
+        shape = (_capacity(len(self.symbols), rows), _capacity(len(dates), cols))
+        old_cols = np.searchsorted(dates, self.dates)
+        present = np.zeros(shape, dtype=bool)
+        present[:rows, old_cols] = self.present[:, :len(self.dates)]
+        for field in FIELDS:
+            values = np.full(shape, np.nan)
+            values[:rows, old_cols] = self.fields[field][:, :len(self.dates)]
+            self.fields[field] = values
+        self.present = present
+        self.dates = dates
+
+    def save(self, path):
+        """Write the cache to path, e.g. in /tmp for the next process on the same machine."""
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def load(path, db_name):
+        """The cache saved at path for db_name, or None if there is no usable one."""
+        try:
+            with open(path, 'rb') as f:
+                cache = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+        return cache if isinstance(cache, PanelCache) and cache.db_name == db_name else None
+
+    def as_of(self, end_time):
+        """Views of every field up to end_time, shaped (symbol, date); nothing is copied."""
+        end = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end_time).date(), 'D'), side='right')
+        count = len(self.symbols)
+        return self.dates[:end], self.present[:count, :end], \
+            {field: values[:count, :end] for field, values in self.fields.items()}
+
+    def _only(self, present, symbols):
+        # Drop the rows of the symbols not in symbols, if given
+        if symbols is None:
+            return present
+        keep = np.zeros(len(present), dtype=bool)
+        keep[[self.symbol_ids[Symbol] for Symbol in symbols if Symbol in self.symbol_ids]] = True
+        return present & keep[:, None]
+
+    def frame(self, end_time, symbols=None):
+        """The rows get_historical_data_from_db returns for end_time, grouped by symbol.
+
+        symbols keeps only their rows.
+        """
+        dates, present, fields = self.as_of(end_time)
+        present = self._only(present, symbols)
+        rows, cols = np.nonzero(present)
+        df = pd.DataFrame({
+            'Market': np.asarray(self.markets, dtype=object)[rows],
+            'Symbol': np.asarray(self.symbols, dtype=object)[rows],
+            'Company_name': np.asarray(self.company_names, dtype=object)[rows],
+        }, index=pd.DatetimeIndex(dates[cols].astype('datetime64[ns]'), name='Date'))
+        for field in FIELDS:
+            df[field] = fields[field][rows, cols]
+        return df
+
+    def price_panel(self, end_time, symbols=None):
+        """Left aligned PricePanel of the bars up to end_time, ready for vectorized_scoring."""
+        dates, present, fields = self.as_of(end_time)
+        present = self._only(present, symbols)
+        symbol_ids, cols = np.nonzero(present)
+        keep, rows = np.unique(symbol_ids, return_inverse=True)
+        lengths = np.bincount(rows, minlength=len(keep))
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        bars = np.arange(len(rows)) - starts[rows]
+        shape = (len(keep), int(lengths.max()) if len(lengths) else 0)
+
+        def pivot(values, fill):
+            out = np.full(shape, fill, dtype=values.dtype)
+            out[rows, bars] = values
+            return out
+
+        arrays = [pivot(fields[field][symbol_ids, cols], np.nan) for field in ('Open', 'High', 'Low', 'Close', 'Volume')]
+        return PricePanel(np.asarray(self.symbols, dtype=object)[keep],
+                          pivot(dates[cols].astype('datetime64[ns]'), np.datetime64('NaT')),
+                          *arrays, lengths)
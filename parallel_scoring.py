@@ -0,0 +1,124 @@
+import contextlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from strategy_specs import STRATEGIES
+from vectorized_scoring import PricePanel, build_panel, score_panel
+
+# Fan symbols out to a process pool. The OHLCV panel is copied once into
+# shared memory and every worker maps it instead of receiving pickled
+# DataFrames; workers only read the rows of the symbols they were given.
+# Workers are started by a forkserver rather than forked from the caller,
+# which may have threads such as the background ScoreWriter holding locks
+# that a forked child would inherit held.
+
+PANEL_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class SharedPanel:
+    """Copy of a PricePanel whose arrays live in shared memory blocks."""
+
+    def __init__(self, panel):
+        self.symbols = panel.symbols
+        self.lengths = panel.lengths
+        self.blocks = {}
+        self.spec = {}
+        arrays = {field: getattr(panel, field) for field in PANEL_FIELDS}
+        arrays['dates'] = panel.dates.view(np.int64)
+        for field, array in arrays.items():
+            self.create(field, array.shape, array.dtype)[...] = array
+
+    def create(self, field, shape, dtype):
+        block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1))
+        self.blocks[field] = block
+        self.spec[field] = (block.name, shape, np.dtype(dtype).str)
+        return np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    def release(self):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+
+    @staticmethod
+    @contextlib.contextmanager
+    def attach(spec):
+        """Map the blocks of a SharedPanel's spec in a worker, yielding the array views by field."""
+        blocks, arrays = [], {}
+        try:
+            for field, (name, shape, dtype) in spec.items():
+                block = shared_memory.SharedMemory(name=name)
+                blocks.append(block)
+                arrays[field] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+            yield arrays
+        finally:
+            for block in blocks:
+                block.close()
+
+
+def _score_rows(spec, strategies, start, stop):
+    with SharedPanel.attach(spec) as arrays:
+        panel = PricePanel(None, arrays['dates'][start:stop].view('datetime64[ns]'),
+                           *(arrays[field][start:stop] for field in PANEL_FIELDS), None)
+        arrays['codes'][:, start:stop] = score_panel(panel, strategies)
+
+
+def _score_symbols(spec, symbols, rows, lengths, date_str):
+    from score_technical_analysis import score_symbols
+    with SharedPanel.attach(spec) as arrays:
+        frames = []
+        for Symbol, row, length in zip(symbols, rows, lengths):
+            frame = pd.DataFrame({field.capitalize(): arrays[field][row, :length] for field in PANEL_FIELDS},
+                                 index=pd.DatetimeIndex(arrays['dates'][row, :length].view('datetime64[ns]'), name='Date'))
+            frame['Symbol'] = Symbol
+            frames.append(frame)
+        return score_symbols(pd.concat(frames), date_str)
+
+
+def scoring_pool(workers=None):
+    """A pool of worker processes for the functions below, to reuse across days."""
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                               mp_context=multiprocessing.get_context('forkserver'))
+
+
+def _chunks(count, workers):
+    size = max(1, -(-count // (workers * 4)))
+    return [(start, min(start + size, count)) for start in range(0, count, size)]
+
+
+def score_panel_parallel(panel, strategies=STRATEGIES, workers=None):
+    """score_panel computed by a pool of worker processes over chunks of symbols."""
+    workers = workers or os.cpu_count()
+    shared = SharedPanel(panel)
+    try:
+        codes = shared.create('codes', (len(strategies),) + panel.close.shape, np.int8)
+        with scoring_pool(workers) as pool:
+            for future in [pool.submit(_score_rows, shared.spec, strategies, start, stop)
+                           for start, stop in _chunks(len(panel.symbols), workers)]:
+                future.result()
+        return codes.copy()
+    finally:
+        shared.release()
+
+
+def score_symbols_parallel(historical_data, date_str, workers=None, pool=None):
+    """score_symbols with the backtrader runs of each symbol spread over a pool of worker processes.
+
+    pool is a scoring_pool to use instead of starting one for this call.
+    """
+    workers = workers or os.cpu_count()
+    panel = build_panel(historical_data)
+    shared = SharedPanel(panel)
+    try:
+        with contextlib.nullcontext(pool) if pool is not None else scoring_pool(workers) as pool:
+            futures = [pool.submit(_score_symbols, shared.spec, panel.symbols[start:stop],
+                                   range(start, stop), panel.lengths[start:stop], date_str)
+                       for start, stop in _chunks(len(panel.symbols), workers)]
+            # Gather in submission order so the symbols keep the order score_symbols uses
+            return [result for future in futures for result in future.result()]
+    finally:
+        shared.release()
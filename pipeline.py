@@ -0,0 +1,154 @@
+import queue
+import threading
+
+import pandas as pd
+
+from connect_to_sqlite import create_table, get_connection, get_panel_cache, save_many_to_sqlite
+from download_spy_stocks import download_spy_stocks
+from metrics import count, timer
+from total_score import next_score_date
+from vectorized_scoring import daily_results, score_panel
+
+# Download and scoring overlapped. The downloader runs on its own thread and
+# hands each symbol to the scorer through a bounded queue as soon as its new
+# bars are committed, so symbols are scored while later batches are still on
+# the network. The scorer takes every symbol waiting in the queue at once, and
+# the vectorized engine waits for a full queue's worth, as its cost is per bar
+# of the panel more than per symbol. A full
+# queue holds the downloader back until the scorer catches up. Ranks need every
+# symbol's score, so they are computed and saved once all symbols have reported.
+# Bars are read through the panel cache, which picks up each committed batch.
+
+_DONE = object()
+
+
+class SymbolScorer:
+    """Scores the days from start_date to end_date one symbol at a time, ranking them all at the end."""
+
+    def __init__(self, start_date, end_date, engine='vectorized'):
+        self.start_date = pd.Timestamp(start_date)
+        self.end_date = pd.Timestamp(end_date)
+        self.end_time = self.end_date.strftime('%Y-%m-%d')
+        self.engine = engine
+        self.scored = {}
+        if engine == 'backtrader':
+            from score_cache import ScoreCache
+            self.cache = ScoreCache()
+
+    def score(self, symbols):
+        """Score the symbols on their saved bars, replacing what an earlier call for them scored."""
+        # The snapshot is written once the download is over, not for every batch
+        cache = get_panel_cache(save=False)
+        with timer('pipeline.score'):
+            if self.engine == 'vectorized':
+                panel = cache.price_panel(self.end_time, symbols)
+                if not len(panel.symbols):
+                    return
+                codes = score_panel(panel)
+                for row, (Symbol, length) in enumerate(zip(panel.symbols, panel.lengths)):
+                    self.scored[Symbol] = panel.dates[row, :length], codes[:, row, :length].T
+                scored = len(panel.symbols)
+            else:
+                blocks = cache.frame(self.end_time, symbols=symbols).groupby('Symbol', sort=False)
+                for Symbol, symbol_data in blocks:
+                    self.scored[Symbol] = self.backtrader_days(Symbol, symbol_data)
+                scored = blocks.ngroups
+        count('pipeline.symbols', scored)
+
+    def backtrader_days(self, Symbol, symbol_data):
+        from score_technical_analysis import score_symbol
+        # Every calendar day scored on the bars up to it, like calculate_total_score
+        results = []
+        for day in pd.date_range(self.start_date.normalize(), self.end_date, freq='D'):
+            bars = symbol_data[symbol_data.index <= day]
+            if len(bars):
+                date_str = day.strftime('%Y-%m-%d')
+                results.append((*score_symbol(Symbol, bars, date_str, cache=self.cache), date_str))
+        self.cache.flush()
+        return results
+
+    def results(self):
+        """The ranked rows of every scored symbol, ready for save_many_to_sqlite."""
+        if self.engine == 'vectorized':
+            symbols = list(self.scored)
+            return daily_results(symbols, [self.scored[Symbol][0] for Symbol in symbols],
+                                 [self.scored[Symbol][1] for Symbol in symbols], self.start_date, self.end_date)
+        with timer('rank'):
+            df_results = pd.DataFrame([row for rows in self.scored.values() for row in rows],
+                                      columns=['Symbol', 'Score', 'Analysis', 'Signals', 'Timestamp'])
+            df_results['Rank'] = df_results.groupby('Timestamp')['Score'].rank(ascending=False, method='min').astype(int)
+        return df_results
+
+
+def run_pipeline(engine='vectorized', queue_size=64, verbose=False, end_date=None, **download_options):
+    """download_spy_stocks and calculate_total_score with the two overlapped.
+
+    engine is 'vectorized' or 'backtrader'. verbose prints the scores saved.
+    end_date, today by default, is the last day scored and the first one not
+    downloaded, as for the two functions. download_options are passed on to
+    download_spy_stocks.
+    """
+    create_table()
+    start_date = next_score_date()
+    end_date = pd.Timestamp(end_date) if end_date is not None else pd.Timestamp.now()
+    scorer = SymbolScorer(start_date, end_date, engine) if start_date <= end_date else None
+    symbols = queue.Queue(maxsize=queue_size)
+    errors = []
+    scoring_failed = threading.Event()
+
+    def put(item):
+        # Gives up once scoring failed, as nothing takes from the queue then
+        while not scoring_failed.is_set():
+            try:
+                symbols.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def saved(Symbol):
+        if not put(Symbol):
+            raise RuntimeError('scoring failed, download stopped')
+
+    def download():
+        try:
+            with timer('pipeline.download'):
+                download_spy_stocks(on_saved=saved, end_date=end_date, **download_options)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            put(_DONE)
+
+    downloader = threading.Thread(target=download, name='download_spy_stocks')
+    downloader.start()
+    batch_size = queue_size if engine == 'vectorized' else 1
+    done = False
+    try:
+        while not done:
+            with timer('pipeline.wait'):
+                batch = [symbols.get()]
+                while batch[-1] is not _DONE and (len(batch) < batch_size or not symbols.empty()):
+                    batch.append(symbols.get())
+            done = batch[-1] is _DONE
+            batch = [Symbol for Symbol in batch if Symbol is not _DONE]
+            if scorer is not None and batch:
+                scorer.score(batch)
+    except BaseException:
+        scoring_failed.set()
+        raise
+    finally:
+        downloader.join()
+    if errors:
+        raise errors[0]
+    # Saves PANEL_SNAPSHOT with the downloaded bars
+    get_panel_cache()
+    if scorer is None:
+        return
+
+    # Symbols that had no new bars still get scored for the remaining days
+    scorer.score([Symbol for Symbol, in get_connection().execute('SELECT DISTINCT Symbol FROM SPY_stock_data')
+                  if Symbol not in scorer.scored])
+    df_results = scorer.results()
+    save_many_to_sqlite(df_results)
+    if verbose:
+        print(df_results)
@@ -0,0 +1,86 @@
+import hashlib
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from connect_to_sqlite import create_strategy_result_table, load_strategy_results, save_strategy_results
+from metrics import count
+
+# Memo of the backtrader strategy results. A result depends only on the bars
+# fed to Cerebro, the strategy's params and its code, so it is saved with a
+# fingerprint of those bars under the symbol, the params and STRATEGY_VERSION,
+# and is recomputed only when one of them changes.
+# Re-running a day after a crash or adding a strategy then only runs what is
+# missing. Only the latest bars of each symbol are kept: a new bar changes
+# the fingerprint, and its results replace those of the bars before it, so
+# the table holds about one run's worth of rows.
+
+# Bump whenever a change to the strategy code changes their results, so the saved ones are not reused
+STRATEGY_VERSION = 1
+
+# About one run's worth: the ~500 SPY holdings times the 20 strategies
+MAX_ROWS = 10000
+
+BAR_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def bars_fingerprint(symbol_data):
+    """Digest of the dates and OHLCV values of one symbol's rows."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(pd.DatetimeIndex(symbol_data.index).asi8.tobytes())
+    digest.update(np.ascontiguousarray(symbol_data[BAR_FIELDS].to_numpy(dtype=float)).tobytes())
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def strategy_key(strategy):
+    """(Strategy, Params) of a strategy class, the params including STRATEGY_VERSION."""
+    return strategy.__name__, f"{tuple(strategy.params._getitems())!r} v{STRATEGY_VERSION}"
+
+
+class ScoreCache:
+    """Strategy results saved in the strategy_result table, flushed once per scored day.
+
+    max_rows bounds the table, evicting the results least recently used.
+    """
+
+    def __init__(self, max_rows=MAX_ROWS):
+        create_strategy_result_table()
+        self.max_rows = max_rows
+        self.used = pd.Timestamp.now().isoformat()
+        self.pending = []
+        # Symbol -> (fingerprint, score_symbol result) of the last bars scored
+        self.latest = {}
+
+    def lookup(self, Symbol, fingerprint, date):
+        """{(Strategy, Params): (score, message)} known for the bars with this fingerprint."""
+        known = load_strategy_results(Symbol, fingerprint)
+        # Saved again as used by this run so eviction keeps them
+        self.pending.extend((Symbol, fingerprint, strategy, params, date, score, message)
+                            for (strategy, params), (score, message) in known.items())
+        return known
+
+    def saved(self, known, strategy):
+        """The (score, message) of strategy in known, the score None if it raised, or None if not saved."""
+        result = known.get(strategy_key(strategy))
+        if result is not None:
+            count('cache.hits')
+        return result
+
+    def save(self, Symbol, fingerprint, date, strategy, score, message):
+        """Save the result of a strategy run on these bars, with a None score and the error if it raised."""
+        self.pending.append((Symbol, fingerprint, *strategy_key(strategy), date, score, message))
+
+    def unchanged(self, Symbol, fingerprint):
+        """The last result of Symbol if it was scored on the same bars, otherwise None."""
+        last_fingerprint, result = self.latest.get(Symbol, (None, None))
+        return result if last_fingerprint == fingerprint else None
+
+    def remember(self, Symbol, fingerprint, result):
+        self.latest[Symbol] = fingerprint, result
+
+    def flush(self):
+        if self.pending:
+            save_strategy_results(self.pending, self.used, self.max_rows)
+            self.pending = []
@@ -1,13 +1,15 @@
 import backtrader as bt
-from connect_to_sqlite import get_historical_data_from_db
-from connect_to_sqlite import create_table, save_to_sqlite
 import pandas as pd
-import sqlite3
+from metrics import count, timer
+from strategy_specs import SPECS, compose_analysis
+# The daily scoring entry points, kept importable without backtrader in total_score
+from total_score import backfill_total_score, calculate_total_score, next_score_date
+
 # Adding scoring to the strategy classes
 
 # 1. MovingAverageCrossover in the short time
 class MovingAverageCrossover(bt.Strategy):
-    params = (('short_window', 3), ('long_window', 5))
+    params = SPECS['MovingAverageCrossover'].params
 
     def __init__(self):
         self.short_mavg = bt.indicators.SimpleMovingAverage(self.data.close, period=self.params.short_window)
@@ -29,7 +31,7 @@ class MovingAverageCrossover(bt.Strategy):
 
 # 2. RsiStrategy
 class RsiStrategy(bt.Strategy):
-    params = (('rsi_period', 5), ('rsi_lower', 3), ('rsi_upper', 7))
+    params = SPECS['RsiStrategy'].params
 
     def __init__(self):
         self.rsi = bt.indicators.RelativeStrengthIndex(self.data.close, period=self.params.rsi_period)
@@ -52,7 +54,7 @@ class RsiStrategy(bt.Strategy):
 
 # 3. BollingerBandsStrategy
 class BollingerBandsStrategy(bt.Strategy):
-    params = (('period', 1), ('devfactor', 2))
+    params = SPECS['BollingerBandsStrategy'].params
 
     def __init__(self):
         self.bbands = bt.indicators.BollingerBands(self.data.close, period=self.params.period, devfactor=self.params.devfactor)
@@ -75,7 +77,7 @@ class BollingerBandsStrategy(bt.Strategy):
 
 # 4. BollingerBandsRTM
 class BollingerBandsRTM(bt.Strategy):
-    params = (("period", 2), ("devfactor", 1.0),)
+    params = SPECS['BollingerBandsRTM'].params
 
     def __init__(self):
         self.boll = bt.indicators.BollingerBands(
@@ -98,7 +100,7 @@ class BollingerBandsRTM(bt.Strategy):
 
 # 5. CommodityChannelIndex
 class CommodityChannelIndex(bt.Strategy):
-    params = (("period", 2), ("threshold", 100),)
+    params = SPECS['CommodityChannelIndex'].params
 
     def __init__(self):
         self.cci = bt.indicators.CCI(self.data, period=self.params.period)
@@ -119,7 +121,7 @@ class CommodityChannelIndex(bt.Strategy):
 
 # 6. TripleExponentialMovingAverage
 class TripleExponentialMovingAverage(bt.Strategy):
-    params = (("period", 1),)
+    params = SPECS['TripleExponentialMovingAverage'].params
 
     def __init__(self):
         self.trix = bt.indicators.TRIX(self.data, period=self.params.period)
@@ -140,7 +142,7 @@ class TripleExponentialMovingAverage(bt.Strategy):
 
 # 7. RateOfChange (ROC)
 class RateOfChange(bt.Strategy):
-    params = (("period", 1),)
+    params = SPECS['RateOfChange'].params
 
     def __init__(self):
         self.roc = bt.indicators.RateOfChange(self.data, period=self.params.period)
@@ -161,7 +163,7 @@ class RateOfChange(bt.Strategy):
 
 # 8. ParabolicSARReversal
 class ParabolicSARReversal(bt.Strategy):
-    params = (("af", 0.02), ("afmax", 0.2))
+    params = SPECS['ParabolicSARReversal'].params
 
     def __init__(self):
         self.sar = bt.indicators.ParabolicSAR(self.data, af=self.params.af, afmax=self.params.afmax)
@@ -218,7 +220,7 @@ class HeikinAshiTrend(bt.Strategy):
 
 # 11. BollingerBandsBreakout
 class BollingerBandsBreakout(bt.Strategy):
-    params = (('period', 20), ('devfactor', 2),)
+    params = SPECS['BollingerBandsBreakout'].params
 
     def __init__(self):
         self.bbands = bt.indicators.BollingerBands(self.data.close, period=self.params.period,
@@ -240,7 +242,7 @@ class BollingerBandsBreakout(bt.Strategy):
 
 # 12. StochasticCross
 class StochasticCross(bt.Strategy):
-    params = (('period', 14), ('upper', 80), ('lower', 20),)
+    params = SPECS['StochasticCross'].params
 
     def __init__(self):
         self.stoch = bt.indicators.Stochastic(self.data, period=self.params.period)
@@ -261,7 +263,7 @@ class StochasticCross(bt.Strategy):
 
 # 13. TRIXCross
 class TRIXCross(bt.Strategy):
-    params = (('period', 3),)
+    params = SPECS['TRIXCross'].params
 
     def __init__(self):
         self.trix = bt.indicators.TRIX(self.data.close, period=self.params.period)
@@ -283,7 +285,7 @@ class TRIXCross(bt.Strategy):
 
 # 14. Momentum
 class Momentum(bt.Strategy):
-    params = (('period', 2),)
+    params = SPECS['Momentum'].params
 
     def __init__(self):
         self.momentum = bt.indicators.Momentum(self.data.close, period=self.params.period)
@@ -304,7 +306,7 @@ class Momentum(bt.Strategy):
 
 # 15. VolumeBreakout
 class VolumeBreakout(bt.Strategy):
-    params = (('sma_period', 20), ('volume_multiplier', 2),)
+    params = SPECS['VolumeBreakout'].params
 
     def __init__(self):
         self.sma = bt.indicators.SimpleMovingAverage(self.data.close, period=self.params.sma_period)
@@ -337,7 +339,7 @@ class VWAPIndicator(bt.Indicator):
         cum_vol_price = bt.indicators.CumulativeSum(self.data.volume * self.data.close)
         self.lines.vwap = cum_vol_price / cum_vol
 class VWAPStrategy(bt.Strategy):
-    params = (('vwap_period', 5),)
+    params = SPECS['VWAPStrategy'].params
 
     def __init__(self):
         self.vwap = VWAPIndicator(self.data, period=self.params.vwap_period)
@@ -359,7 +361,7 @@ class VWAPStrategy(bt.Strategy):
 
 # 17. Moving Average Convergence Divergence (MACD)
 class MACDStrategy(bt.Strategy):
-    params = (('fast_length', 12), ('slow_length', 26), ('signal_length', 9),)
+    params = SPECS['MACDStrategy'].params
 
     def __init__(self):
         self.macd = bt.indicators.MACD(self.data.close,
@@ -417,7 +419,7 @@ class OBVStrategy(bt.Strategy):
 
 # 19. Moving Averages in the long time
 class SMAStrategy(bt.Strategy):
-    params = (('short_window', 50), ('long_window', 200),)
+    params = SPECS['SMAStrategy'].params
 
     def __init__(self):
         self.short_sma = bt.indicators.SimpleMovingAverage(self.data.close, period=self.params.short_window)
@@ -437,7 +439,7 @@ class SMAStrategy(bt.Strategy):
 
 # 20. Support and Resistance Levels
 class SupportResistanceStrategy(bt.Strategy):
-    params = (('support_resistance_period', 50),)
+    params = SPECS['SupportResistanceStrategy'].params
 
     def __init__(self):
         self.support = bt.indicators.Lowest(self.data.low, period=self.params.support_resistance_period)
@@ -468,73 +470,85 @@ def run_backtest(strategy_class, symbol, historical_data):
     return strats[0].get_score()  # Note: This now returns a tuple (score, analysis_message)
 
 
-def calculate_total_score():
-    Stragegies = [
-        MovingAverageCrossover, BollingerBandsStrategy, RsiStrategy,
-        BollingerBandsRTM, CommodityChannelIndex, TripleExponentialMovingAverage,
-        RateOfChange, ParabolicSARReversal, AwesomeOscillatorCross, HeikinAshiTrend,
-        BollingerBandsBreakout, StochasticCross, TRIXCross, Momentum, VolumeBreakout,
-        VWAPStrategy, MACDStrategy, OBVStrategy, SMAStrategy, SupportResistanceStrategy
-    ]
-    create_table()
-    start_date_score = '2022-01-01'
-    end_date_score = pd.Timestamp.now()
-    conn = sqlite3.connect('db.sqlite3')
-    cursor = conn.cursor()
-    cursor.execute(f"SELECT MAX(Timestamp) FROM technical_analysis_score")
-    max_date = cursor.fetchone()[0]
-    if max_date is not None:
-        current_date = pd.Timestamp(max_date) + pd.DateOffset(1)
-    else:
-        current_date = pd.Timestamp(start_date_score)
-
-    while current_date <= end_date_score:
-        date_str = current_date.strftime('%Y-%m-%d')
-        historical_data = get_historical_data_from_db(date_str)
-
-        current_date += pd.Timedelta(days=1)
-
-        symbols_list = historical_data['Symbol'].unique()
-        results = []
-
-        for Symbol in symbols_list:
-            total_score = 0
-            strategy_analysis = []  # List to accumulate the analysis messages
-            print("Technical Score for " + Symbol + " on " + date_str + "...")
-
-            end_date = date_str
-
-            for strategy in Stragegies:
-                try:
-                    score, analysis_message = run_backtest(strategy, Symbol, historical_data)
-                    total_score += score
-                    strategy_analysis.append(analysis_message)  # Add the analysis message to the list
-                except Exception as e:
-                    print(f"Error calculating score using {strategy} for {Symbol}: {str(e)}")
-
-            # Combine the accumulated analysis messages into a single string
-            combined_analysis = '\n'.join(strategy_analysis)
-
-            # Determine the overall sentiment based on total score
-            sentiment_analysis = f"Overall {Symbol} is Neutral for our 20 technical analysis.\n"
-            if total_score > 0:
-                sentiment_analysis = f"Overall {Symbol} is Bearish for our 20 technical analysis.\n"
-            elif total_score < 0:
-                sentiment_analysis = f"Overall {Symbol} is Bullish for our 20 technical analysis.\n"
-
-            # Combine the sentiment analysis with the combined analysis from the strategies
-            final_analysis = f"{sentiment_analysis}Details: \n{combined_analysis}"
-
-            print(f"Total score for {Symbol}: {total_score}. Analysis: {final_analysis}\n")
-            results.append((Symbol, total_score, final_analysis))
-
-        df_results = pd.DataFrame(results, columns=['Symbol', 'Score', 'Analysis'])
-        df_results['Rank'] = df_results['Score'].rank(ascending=False, method='min').astype(int)
-
-
-        for index, row in df_results.iterrows():
-            save_to_sqlite(row['Symbol'], row['Score'], row['Rank'], row['Analysis'], end_date)
-
-        print(df_results)
+# The backtrader classes of the strategies in strategy_specs, in the same order
+STRATEGIES = [globals()[name] for name in SPECS]
+
+
+def score_symbol(Symbol, symbol_data, date_str, verbose=False, cache=None):
+    """Run every strategy through backtrader on the rows of one symbol.
+
+    Returns (Symbol, total score, analysis, signal vector), the signal vector
+    being None if a result has no code in the message tables. With a
+    score_cache.ScoreCache, only the strategies without a saved result for
+    these bars are run, and none at all if the bars are the ones last scored.
+    """
+    from vectorized_scoring import FAILED, signal_code
+    if cache is not None:
+        from score_cache import bars_fingerprint
+        fingerprint = bars_fingerprint(symbol_data)
+        result = cache.unchanged(Symbol, fingerprint)
+        if result is not None:
+            count('cache.unchanged_symbols')
+            return result
+        last_date = symbol_data.index[-1].strftime('%Y-%m-%d')
+        known = cache.lookup(Symbol, fingerprint, last_date)
+    total_score = 0
+    strategy_analysis = []  # List to accumulate the analysis messages
+    signals = []
+    if verbose:
+        print("Technical Score for " + Symbol + " on " + date_str + "...")
+
+    def backtest(strategy):
+        with timer(f'score.{strategy.__name__}'):
+            return run_backtest(strategy, Symbol, symbol_data)
+
+    for strategy in STRATEGIES:
+        # The memo is read and written outside the try, so only a strategy raising counts as FAILED
+        saved = cache.saved(known, strategy) if cache is not None else None
+        try:
+            if saved is None:
+                score, analysis_message = backtest(strategy)
+            elif saved[0] is None:
+                raise RuntimeError(saved[1])
+            else:
+                score, analysis_message = saved
+        except Exception as e:
+            if cache is not None and saved is None:
+                cache.save(Symbol, fingerprint, last_date, strategy, None, f"{type(e).__name__}: {e}")
+            signals.append(FAILED)
+            count(f'failed.{strategy.__name__}')
+            if verbose:
+                print(f"Error calculating score using {strategy} for {Symbol}: {str(e)}")
+            continue
+        if cache is not None and saved is None:
+            cache.save(Symbol, fingerprint, last_date, strategy, score, analysis_message)
+        total_score += score
+        strategy_analysis.append(analysis_message)  # Add the analysis message to the list
+        signals.append(signal_code(strategy.__name__, score, analysis_message))
+
+    final_analysis = compose_analysis(Symbol, total_score, strategy_analysis)
+
+    if verbose:
+        print(f"Total score for {Symbol}: {total_score}. Analysis: {final_analysis}\n")
+    result = Symbol, total_score, final_analysis, None if None in signals else tuple(signals)
+    if cache is not None:
+        cache.remember(Symbol, fingerprint, result)
+    return result
+
+
+def score_symbols(historical_data, date_str, verbose=False, cache=None):
+    """score_symbol for each symbol in historical_data.
+
+    historical_data is either a DataFrame of several symbols, split into one
+    block per symbol up front, or (Symbol, rows) blocks such as iter_symbol_data yields.
+    verbose prints the score and analysis of each symbol as it goes.
+    """
+    if isinstance(historical_data, pd.DataFrame):
+        historical_data = historical_data.groupby('Symbol', sort=False)
+    results = [score_symbol(Symbol, symbol_data, date_str, verbose, cache) for Symbol, symbol_data in historical_data]
+    if cache is not None:
+        cache.flush()
+    return results
+
 
 # calculate_total_score()
\ No newline at end of file
@@ -0,0 +1,56 @@
+from collections import namedtuple
+
+# The 20 strategies as the scoring engines know them: the name of the
+# backtrader class in score_technical_analysis and its default params, which
+# that class takes from here. Only the backtrader engine needs backtrader, so
+# the vectorized and incremental engines, the score table columns and the
+# lambda entry point use these instead of the classes and never import it.
+
+StrategySpec = namedtuple('StrategySpec', 'name params')
+
+STRATEGIES = [
+    StrategySpec('MovingAverageCrossover', (('short_window', 3), ('long_window', 5))),
+    StrategySpec('BollingerBandsStrategy', (('period', 1), ('devfactor', 2))),
+    StrategySpec('RsiStrategy', (('rsi_period', 5), ('rsi_lower', 3), ('rsi_upper', 7))),
+    StrategySpec('BollingerBandsRTM', (('period', 2), ('devfactor', 1.0))),
+    StrategySpec('CommodityChannelIndex', (('period', 2), ('threshold', 100))),
+    StrategySpec('TripleExponentialMovingAverage', (('period', 1),)),
+    StrategySpec('RateOfChange', (('period', 1),)),
+    StrategySpec('ParabolicSARReversal', (('af', 0.02), ('afmax', 0.2))),
+    StrategySpec('AwesomeOscillatorCross', ()),
+    StrategySpec('HeikinAshiTrend', ()),
+    StrategySpec('BollingerBandsBreakout', (('period', 20), ('devfactor', 2))),
+    StrategySpec('StochasticCross', (('period', 14), ('upper', 80), ('lower', 20))),
+    StrategySpec('TRIXCross', (('period', 3),)),
+    StrategySpec('Momentum', (('period', 2),)),
+    StrategySpec('VolumeBreakout', (('sma_period', 20), ('volume_multiplier', 2))),
+    StrategySpec('VWAPStrategy', (('vwap_period', 5),)),
+    StrategySpec('MACDStrategy', (('fast_length', 12), ('slow_length', 26), ('signal_length', 9))),
+    StrategySpec('OBVStrategy', ()),
+    StrategySpec('SMAStrategy', (('short_window', 50), ('long_window', 200))),
+    StrategySpec('SupportResistanceStrategy', (('support_resistance_period', 50),)),
+]
+
+SPECS = {strategy.name: strategy for strategy in STRATEGIES}
+
+
+def strategy_params(strategy, **overrides):
+    """The params of a StrategySpec as a dict, with the given ones overridden."""
+    params = dict(strategy.params)
+    params.update(overrides)
+    return params
+
+
+def compose_analysis(Symbol, total_score, strategy_analysis):
+    # Combine the accumulated analysis messages into a single string
+    combined_analysis = '\n'.join(strategy_analysis)
+
+    # Determine the overall sentiment based on total score
+    sentiment_analysis = f"Overall {Symbol} is Neutral for our 20 technical analysis.\n"
+    if total_score > 0:
+        sentiment_analysis = f"Overall {Symbol} is Bearish for our 20 technical analysis.\n"
+    elif total_score < 0:
+        sentiment_analysis = f"Overall {Symbol} is Bullish for our 20 technical analysis.\n"
+
+    # Combine the sentiment analysis with the combined analysis from the strategies
+    return f"{sentiment_analysis}Details: \n{combined_analysis}"
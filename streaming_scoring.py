@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import bisect
+import copy
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+from connect_to_sqlite import get_connection
+from incremental_scoring import SymbolState, load_states
+from metrics import count, timer
+from strategy_specs import STRATEGIES, compose_analysis
+from vectorized_scoring import decode
+
+# Scores bars as they arrive instead of once a day. Each symbol keeps the
+# indicator state of incremental_scoring; a bar is scored by advancing a copy
+# of that state, so the latest bar of a day can be revised by later updates of
+# the same day until a bar of a newer day commits it. Every scored bar
+# publishes the symbol's score and its rank among all symbols to the
+# subscribers' queues.
+#
+# A source is any async iterable of Bar, e.g. ReplaySource replaying
+# SPY_stock_data:
+#
+#   python streaming_scoring.py --start 2023-10-02 --delay 0.01
+
+Bar = namedtuple('Bar', 'Date Symbol Open High Low Close Volume')
+
+ScoreUpdate = namedtuple('ScoreUpdate', 'Date Symbol Score Rank Analysis Latency')
+
+
+class ReplaySource:
+    """Replays the SPY_stock_data bars from start_date to end_date in the order they were saved.
+
+    delay seconds are slept between bars to mimic a live feed.
+    """
+
+    def __init__(self, start_date, end_date='9999-12-31', delay=0.0, symbols=None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.delay = delay
+        self.symbols = symbols
+
+    async def __aiter__(self):
+        query = '''
+        SELECT Date, Symbol, Open, High, Low, Close, Volume FROM SPY_stock_data
+        WHERE Date >= ? AND Date <= ?'''
+        params = [self.start_date, self.end_date]
+        if self.symbols is not None:
+            query += f" AND Symbol IN ({', '.join('?' * len(self.symbols))})"
+            params.extend(self.symbols)
+        for row in get_connection().execute(query + ' ORDER BY Date, rowid', params):
+            yield Bar(*row)
+            await asyncio.sleep(self.delay)
+
+
+class StreamingScorer:
+    def __init__(self, strategies=STRATEGIES):
+        self.strategies = strategies
+        # Indicator states as of each symbol's last committed bar
+        self.states = {}
+        # Symbol -> (Date, state advanced through the latest bar of that date)
+        self.pending = {}
+        self.scores = {}
+        # Every symbol's current score, ascending, for ranking
+        self.ranking = []
+        self.subscribers = []
+
+    def warm_up(self, end_time):
+        """Bring the indicator states up to end_time, from the saved ones where possible."""
+        states, new_data = load_states(end_time, self.strategies)
+        for Symbol, rows in new_data.groupby('Symbol', sort=False):
+            state = states.get(Symbol) or SymbolState(self.strategies)
+            for date, open, high, low, close, volume in rows[
+                    ['Date', 'Open', 'High', 'Low', 'Close', 'Volume']].itertuples(index=False, name=None):
+                if state.date is None or date > state.date:
+                    state.advance(date, float(open), float(high), float(low), float(close), float(volume))
+            states[Symbol] = state
+        self.states = states
+        for Symbol, state in states.items():
+            self.set_score(Symbol, decode(self.strategies, state.codes)[0])
+
+    def subscribe(self, maxsize=0):
+        """A queue receiving a ScoreUpdate for every scored bar."""
+        queue = asyncio.Queue(maxsize)
+        self.subscribers.append(queue)
+        return queue
+
+    def set_score(self, Symbol, score):
+        if Symbol in self.scores:
+            del self.ranking[bisect.bisect_left(self.ranking, self.scores[Symbol])]
+        self.scores[Symbol] = score
+        bisect.insort(self.ranking, score)
+
+    def rank(self, Symbol):
+        """1 + the number of symbols scoring higher, like rank(ascending=False, method='min')."""
+        return len(self.ranking) - bisect.bisect_right(self.ranking, self.scores[Symbol]) + 1
+
+    def update(self, bar, received=None):
+        """Score one bar, committing the symbol's previous day if this bar starts a new one."""
+        received = received or time.perf_counter()
+        Symbol = bar.Symbol
+        pending = self.pending.get(Symbol)
+        if pending is not None and bar.Date > pending[0]:
+            self.states[Symbol] = pending[1]
+        state = self.states.get(Symbol) or SymbolState(self.strategies)
+        if state.date is not None and bar.Date <= state.date:
+            count('stream.stale_bars')
+            return None
+        state = copy.deepcopy(state)
+        codes = state.advance(bar.Date, float(bar.Open), float(bar.High), float(bar.Low), float(bar.Close),
+                              float(bar.Volume))
+        self.pending[Symbol] = bar.Date, state
+        total_score, strategy_analysis = decode(self.strategies, codes)
+        self.set_score(Symbol, total_score)
+        return ScoreUpdate(bar.Date, Symbol, total_score, self.rank(Symbol),
+                           compose_analysis(Symbol, total_score, strategy_analysis),
+                           time.perf_counter() - received)
+
+    def commit(self):
+        """Make the latest bar of every symbol final, e.g. at the close."""
+        for Symbol, (date, state) in self.pending.items():
+            self.states[Symbol] = state
+        self.pending = {}
+
+    async def run(self, source):
+        """Score every bar of source as it arrives and publish the updates."""
+        async for bar in source:
+            received = time.perf_counter()
+            with timer('stream.update'):
+                update = self.update(bar, received)
+            if update is None:
+                continue
+            count('stream.bars')
+            for queue in self.subscribers:
+                await queue.put(update)
+        self.commit()
+
+
+async def replay(start_date, end_date='9999-12-31', delay=0.0, symbols=None, on_update=print):
+    """Warm up on the bars before start_date, then stream the later ones through on_update."""
+    scorer = StreamingScorer()
+    scorer.warm_up((pd.Timestamp(start_date) - pd.Timedelta(days=1)).strftime('%Y-%m-%d'))
+    updates = scorer.subscribe()
+
+    async def consume():
+        while True:
+            on_update(await updates.get())
+            updates.task_done()
+
+    consumer = asyncio.create_task(consume())
+    await scorer.run(ReplaySource(start_date, end_date, delay, symbols))
+    await updates.join()
+    consumer.cancel()
+    return scorer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay SPY_stock_data through the streaming scorer.')
+    parser.add_argument('--start', required=True)
+    parser.add_argument('--end', default='9999-12-31')
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds between bars')
+    args = parser.parse_args(argv)
+    asyncio.run(replay(args.start, args.end, args.delay,
+                       on_update=lambda update: print(f"{update.Date} {update.Symbol:6s} score {update.Score:4d} "
+                                                      f"rank {update.Rank:4d} "
+                                                      f"{update.Latency * 1000:.2f} ms")))
+
+
+if __name__ == '__main__':
+    main()
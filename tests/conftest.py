@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import connect_to_sqlite
+
+SPY_STOCK_DATA = '''
+CREATE TABLE SPY_stock_data (
+    Date TEXT, Market TEXT, Symbol TEXT, Company_name TEXT,
+    Open FLOAT, High FLOAT, Low FLOAT, Close FLOAT, Volume BIGINT, Market_Cap FLOAT, Turnover_Rate FLOAT,
+    PRIMARY KEY (Date, Symbol)
+)'''
+
+
+def walk(n, seed, drift=0):
+    """n closes of a random walk from 100, with daily log returns of mean drift."""
+    rng = np.random.default_rng(seed)
+    return np.round(100 * np.exp(np.cumsum(rng.normal(drift, 0.02, n))), 2)
+
+
+def bars(Symbol, close, seed=0):
+    """SPY_stock_data rows of Symbol closing at close, one business day each from 2022-01-03."""
+    rng = np.random.default_rng(seed)
+    n = len(close)
+    open_ = np.round(close * (1 + rng.normal(0, 0.01, n)), 2)
+    return pd.DataFrame({
+        'Market': 'US', 'Symbol': Symbol, 'Company_name': Symbol,
+        'Open': open_, 'High': np.maximum(open_, close) + np.round(rng.uniform(0, 1, n), 2),
+        'Low': np.maximum(np.minimum(open_, close) - np.round(rng.uniform(0, 1, n), 2), 0.01),
+        'Close': close, 'Volume': rng.integers(100000, 10000000, n).astype(float),
+        'Market_Cap': None, 'Turnover_Rate': None,
+    }, index=pd.DatetimeIndex(pd.bdate_range('2022-01-03', periods=n), name='Date'))
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A connection to an empty database in tmp_path, made the DB_NAME of connect_to_sqlite."""
+    monkeypatch.setattr(connect_to_sqlite, 'DB_NAME', str(tmp_path / 'db.sqlite3'))
+    yield connect_to_sqlite.get_connection()
+    connect_to_sqlite.close_connection()
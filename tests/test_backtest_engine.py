@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from backtest_engine import Backtest
+
+PARAMS = [(2, -20), (0, -5), (5, 0), (10, -10), (20, -1)]
+
+
+def _merged(n_symbols=6, n_days=30, seed=0):
+    # Scores with ties and some symbols missing on some days
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2022-01-03', periods=n_days).strftime('%Y-%m-%d')
+    rows = [(date, f'S{i}', round(rng.uniform(5, 200), 2), int(rng.integers(-20, 21)))
+            for date in dates for i in rng.permutation(n_symbols) if rng.random() > 0.1]
+    return pd.DataFrame(rows, columns=['Date', 'Symbol', 'Close', 'technical_analysis_score'])
+
+
+def _fees(num_shares):
+    return max(0.0039 * num_shares, 0.99) + max(0.004 * num_shares, 1) + max(0.00396 * num_shares, 0.99)
+
+
+def _baseline(merged, m, n):
+    # The per-row loop train_backtest and test_backtest ran before backtest_engine
+    total_investment = 0
+    sold_earning = 0
+    positions = {}
+    net_earning = 0
+    for date, day_data in merged.groupby('Date'):
+        eligible_stocks = day_data[day_data['technical_analysis_score'] >= m]
+        num_stocks = len(eligible_stocks)
+        for index, stock in eligible_stocks.iterrows():
+            amount_to_invest = 500000 / num_stocks
+            num_shares = amount_to_invest / stock['Close']
+            positions[stock['Symbol']] = positions.get(stock['Symbol'], 0) + num_shares
+            total_investment += amount_to_invest + _fees(num_shares)
+        for index, stock in day_data[day_data['technical_analysis_score'] <= n].iterrows():
+            if stock['Symbol'] in positions:
+                sold_earning += positions[stock['Symbol']] * stock['Close'] - _fees(positions[stock['Symbol']])
+                del positions[stock['Symbol']]
+        holding_earning = sum(
+            [stock['Close'] * positions.get(stock['Symbol'], 0) for index, stock in day_data.iterrows()])
+        net_earning = sold_earning + holding_earning - total_investment
+    return net_earning
+
+
+def test_run_and_sweep_match_the_baseline_loop():
+    merged = _merged()
+    backtest = Backtest(merged)
+    expected = [_baseline(merged, m, n) for m, n in PARAMS]
+    assert [backtest.run(m, n).final_net_earning for m, n in PARAMS] == expected
+    ms, ns = zip(*PARAMS)
+    assert backtest.sweep(ms, ns).tolist() == expected
+
+
+def test_resumed_run_matches_one_run():
+    merged = _merged()
+    split = merged['Date'] < sorted(merged['Date'].unique())[12]
+    for m, n in PARAMS:
+        first = Backtest(merged[split]).run(m, n)
+        resumed = Backtest(merged[~split]).run(m, n, portfolio=first.portfolio)
+        whole = Backtest(merged).run(m, n)
+        assert resumed.final_net_earning == whole.final_net_earning == _baseline(merged, m, n)
+        assert resumed.portfolio.positions == whole.portfolio.positions
@@ -0,0 +1,34 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from conftest import SPY_STOCK_DATA, bars, walk
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCORE = '''
+import sys
+import lambda_function
+from total_score import calculate_total_score
+calculate_total_score(engine=sys.argv[1], end_date='2022-03-01')
+assert 'backtrader' not in sys.modules, 'backtrader imported'
+'''
+
+
+@pytest.mark.parametrize('engine', ['vectorized', 'incremental'])
+def test_engine_runs_without_backtrader(tmp_path, engine):
+    conn = sqlite3.connect(tmp_path / 'db.sqlite3')
+    conn.execute(SPY_STOCK_DATA)
+    symbol_data = bars('A', walk(30, 6))
+    symbol_data.index = symbol_data.index.strftime('%Y-%m-%d')
+    symbol_data.to_sql('SPY_stock_data', conn, if_exists='append')
+    conn.close()
+    # A fresh process, as a cold lambda container would be
+    subprocess.run([sys.executable, '-c', SCORE, engine], cwd=tmp_path, env=dict(os.environ, PYTHONPATH=ROOT),
+                   check=True, stdout=subprocess.DEVNULL)
+    conn = sqlite3.connect(tmp_path / 'db.sqlite3')
+    assert conn.execute('SELECT COUNT(*) FROM technical_analysis_score').fetchone()[0] > 0
+    conn.close()
@@ -0,0 +1,130 @@
+import pandas as pd
+import pytest
+
+from conftest import bars, walk
+from download_spy_stocks import FakeProvider, download_spy_stocks
+
+SYMBOLS = ['A', 'B', 'C', 'D', 'E']
+
+
+class RecordingProvider(FakeProvider):
+    """FakeProvider remembering the symbols of every download and info request."""
+
+    def __init__(self, *args, broken_info=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = []
+        self.info_requests = []
+        self.broken_info = broken_info
+
+    def download(self, symbols, start, end):
+        self.requests.append(list(symbols))
+        return super().download(symbols, start, end)
+
+    def info(self, symbol):
+        self.info_requests.append(symbol)
+        if symbol in self.broken_info:
+            raise ConnectionError("injected info failure")
+        return super().info(symbol)
+
+
+@pytest.fixture
+def holdings(db):
+    db.execute('CREATE TABLE spy_holdings_symbols (symbol TEXT, company_name TEXT)')
+    db.executemany('INSERT INTO spy_holdings_symbols VALUES (?, ?)', [(Symbol, f'{Symbol} Inc') for Symbol in SYMBOLS])
+    db.commit()
+    return db
+
+
+def _history(symbols=SYMBOLS, n=10):
+    frames = [bars(Symbol, walk(n, 8 + i), i) for i, Symbol in enumerate(symbols)]
+    return pd.concat(frames).reset_index()[['Date', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume']]
+
+
+def _info():
+    return {Symbol: {'marketCap': 1e9, 'floatShares': 1e6} for Symbol in SYMBOLS}
+
+
+def _saved(db):
+    return db.execute('SELECT Symbol, COUNT(*) FROM SPY_stock_data GROUP BY Symbol').fetchall()
+
+
+def test_downloads_in_batches(holdings):
+    provider = RecordingProvider(_history(), _info(), latency=0.01)
+    saved = []
+    download_spy_stocks(provider, batch_size=2, workers=2, backoff=0, end_date='2022-02-01', on_saved=saved.append)
+    assert sorted(len(symbols) for symbols in provider.requests) == [1, 2, 2]
+    assert sorted(Symbol for symbols in provider.requests for Symbol in symbols) == SYMBOLS
+    assert _saved(holdings) == [(Symbol, 10) for Symbol in SYMBOLS]
+    assert sorted(saved) == SYMBOLS
+    row = holdings.execute("SELECT Market_Cap, Turnover_Rate, Volume FROM SPY_stock_data LIMIT 1").fetchone()
+    assert row[0] == 1e9 and row[1] == pytest.approx(100 * row[2] / 1e6)
+
+    # A second run only asks for the days after the saved ones
+    provider = RecordingProvider(_history(n=12), _info())
+    download_spy_stocks(provider, batch_size=5, backoff=0, end_date='2022-02-01')
+    assert provider.requests == [SYMBOLS]
+    assert _saved(holdings) == [(Symbol, 12) for Symbol in SYMBOLS]
+
+
+def test_retries_failed_downloads(holdings):
+    provider = RecordingProvider(_history(), _info(), failures=2)
+    download_spy_stocks(provider, batch_size=5, retries=3, backoff=0, end_date='2022-02-01')
+    assert len(provider.requests) == 3
+    assert _saved(holdings) == [(Symbol, 10) for Symbol in SYMBOLS]
+
+
+def test_skips_a_batch_out_of_retries(holdings):
+    # One worker runs the batches in order, so only the first one fails
+    provider = RecordingProvider(_history(), _info(), failures=3)
+    saved = []
+    download_spy_stocks(provider, batch_size=2, workers=1, retries=2, backoff=0, end_date='2022-02-01',
+                        on_saved=saved.append)
+    assert _saved(holdings) == [(Symbol, 10) for Symbol in ['C', 'D', 'E']]
+    assert sorted(saved) == ['C', 'D', 'E']
+
+
+def test_saves_the_symbols_a_batch_has_bars_for(holdings):
+    provider = RecordingProvider(_history(['A', 'C', 'D']), _info())
+    saved = []
+    download_spy_stocks(provider, batch_size=5, backoff=0, end_date='2022-02-01', on_saved=saved.append)
+    assert _saved(holdings) == [('A', 10), ('C', 10), ('D', 10)]
+    assert sorted(saved) == ['A', 'C', 'D']
+
+
+def test_keeps_the_bars_when_info_fails(holdings):
+    provider = RecordingProvider(_history(), _info(), broken_info={'B'})
+    download_spy_stocks(provider, batch_size=5, retries=1, backoff=0, end_date='2022-02-01')
+    assert _saved(holdings) == [(Symbol, 10) for Symbol in SYMBOLS]
+    assert holdings.execute("SELECT DISTINCT Market_Cap, Turnover_Rate FROM SPY_stock_data WHERE Symbol = 'B'"
+                            ).fetchall() == [(None, None)]
+    # Its missing metadata is not cached, so the next run asks again
+    cached = [Symbol for Symbol, in holdings.execute('SELECT Symbol FROM ticker_metadata ORDER BY Symbol')]
+    assert cached == ['A', 'C', 'D', 'E']
+    provider = RecordingProvider(_history(n=12), _info())
+    download_spy_stocks(provider, batch_size=5, backoff=0, end_date='2022-02-01')
+    assert provider.info_requests == ['B']
+
+
+def test_refetches_metadata_older_than_its_ttl(holdings):
+    provider = RecordingProvider(_history(), _info())
+    download_spy_stocks(provider, batch_size=5, backoff=0, end_date='2022-02-01')
+    assert sorted(provider.info_requests) == SYMBOLS
+    # Within the TTL the cached metadata is used
+    provider = RecordingProvider(_history(n=11), _info())
+    download_spy_stocks(provider, batch_size=5, backoff=0, end_date='2022-02-01')
+    assert provider.info_requests == []
+    provider = RecordingProvider(_history(n=12), _info())
+    download_spy_stocks(provider, batch_size=5, backoff=0, end_date='2022-02-01', metadata_ttl=pd.Timedelta(0))
+    assert sorted(provider.info_requests) == SYMBOLS
+    assert _saved(holdings) == [(Symbol, 12) for Symbol in SYMBOLS]
+
+
+def test_stops_when_on_saved_raises(holdings):
+    provider = RecordingProvider(_history(), _info())
+
+    def on_saved(Symbol):
+        raise RuntimeError('scoring failed')
+
+    with pytest.raises(RuntimeError, match='scoring failed'):
+        download_spy_stocks(provider, batch_size=1, workers=1, backoff=0, end_date='2022-02-01', on_saved=on_saved)
+    assert len(_saved(holdings)) < len(SYMBOLS)
@@ -0,0 +1,41 @@
+import pandas as pd
+
+from conftest import SPY_STOCK_DATA, bars, walk
+from connect_to_sqlite import save_indicator_states
+from incremental_scoring import update_scores
+
+COLUMNS = ['Symbol', 'Score', 'Analysis', 'Timestamp', 'Signals', 'Rank']
+
+
+def test_update_scores_without_bars(db):
+    db.execute(SPY_STOCK_DATA)
+    df_results, states = update_scores('2022-01-01', '2022-01-31')
+    assert df_results.empty and list(df_results.columns) == COLUMNS
+    assert states == {}
+
+
+def test_update_scores_without_days(db):
+    db.execute(SPY_STOCK_DATA)
+    pd.DataFrame({'Date': ['2022-03-01', '2022-03-02'], 'Market': 'US', 'Symbol': 'A', 'Company_name': 'A',
+                  'Open': 10.0, 'High': 11.0, 'Low': 9.0, 'Close': 10.5, 'Volume': 1000,
+                  'Market_Cap': None, 'Turnover_Rate': None}).to_sql('SPY_stock_data', db, if_exists='append',
+                                                                      index=False)
+    # Before the first bar, and an empty range
+    for start_date, end_date in [('2022-01-01', '2022-01-31'), ('2022-03-05', '2022-03-01')]:
+        df_results, states = update_scores(start_date, end_date)
+        assert df_results.empty and list(df_results.columns) == COLUMNS
+
+
+def test_resumed_states_score_like_one_pass(db):
+    db.execute(SPY_STOCK_DATA)
+    symbol_data = pd.concat([bars(Symbol, walk(60, seed), seed) for seed, Symbol in enumerate(['A', 'B', 'C'])])
+    symbol_data.index = symbol_data.index.strftime('%Y-%m-%d')
+    symbol_data.to_sql('SPY_stock_data', db, if_exists='append')
+    db.commit()
+    first, states = update_scores('2022-01-03', '2022-02-15')
+    save_indicator_states(states)
+    resumed, _ = update_scores('2022-02-16', '2022-03-25')
+    db.execute('DELETE FROM indicator_state')
+    db.commit()
+    full, _ = update_scores('2022-01-03', '2022-03-25')
+    pd.testing.assert_frame_equal(pd.concat([first, resumed], ignore_index=True), full.reset_index(drop=True))
@@ -0,0 +1,45 @@
+from connect_to_sqlite import save_run_metrics
+from metrics import Metrics, NullMetrics, count, get_metrics, set_metrics, timer
+
+
+def test_stages_and_counters_add_up():
+    metrics = Metrics()
+    for _ in range(2):
+        with metrics.timer('load'):
+            pass
+    metrics.add('score', 1.5, 2.0)
+    metrics.add('score', 0.5)
+    metrics.count('symbols', 3)
+    metrics.count('symbols')
+    summary = metrics.summary()
+    assert summary['stages']['load']['calls'] == 2 and summary['stages']['load']['seconds'] >= 0
+    assert summary['stages']['score'] == {'seconds': 2.0, 'calls': 2, 'rss_growth_mb': 2.0}
+    assert summary['counters'] == {'symbols': 4}
+    assert summary['run'] != Metrics().run
+
+
+def test_set_metrics_swaps_the_recorder():
+    previous = set_metrics(NullMetrics())
+    try:
+        with timer('load'):
+            count('symbols')
+        assert get_metrics().summary()['stages'] == {} and get_metrics().summary()['counters'] == {}
+        recorder = Metrics()
+        set_metrics(recorder)
+        with timer('load'):
+            count('symbols')
+        assert recorder.stages['load']['calls'] == 1 and recorder.counters == {'symbols': 1}
+    finally:
+        set_metrics(previous)
+
+
+def test_save_run_metrics(db):
+    metrics = Metrics()
+    metrics.add('score', 1.5, 2.0)
+    metrics.count('symbols', 3)
+    save_run_metrics(metrics.summary())
+    save_run_metrics(Metrics().summary())
+    rows = db.execute('SELECT Run, Started, Stage, Seconds, Calls, RSS_Growth_MB FROM run_metrics '
+                      'WHERE Run = ? ORDER BY Stage', (metrics.run,)).fetchall()
+    assert rows == [(metrics.run, metrics.started, 'score', 1.5, 1, 2.0),
+                    (metrics.run, metrics.started, 'symbols', None, 3, None)]
@@ -0,0 +1,45 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import connect_to_sqlite
+from conftest import SPY_STOCK_DATA, bars
+from connect_to_sqlite import get_historical_data_from_db, iter_symbol_data
+
+
+def _append(db, symbol_data):
+    symbol_data = symbol_data.copy()
+    symbol_data.index = symbol_data.index.strftime('%Y-%m-%d')
+    symbol_data.to_sql('SPY_stock_data', db, if_exists='append')
+    db.commit()
+
+
+def test_refresh_reads_through_the_shared_connection(db, monkeypatch):
+    db.execute(SPY_STOCK_DATA)
+    symbol_data = bars('A', np.linspace(10, 20, 10))
+    _append(db, symbol_data.iloc[:6])
+
+    def connect(*args, **kwargs):
+        raise AssertionError('opened a connection of its own')
+
+    monkeypatch.setattr(sqlite3, 'connect', connect)
+    assert len(get_historical_data_from_db('2022-12-31')) == 6
+    # Rows appended later are picked up by the next call
+    _append(db, symbol_data.iloc[6:])
+    df = get_historical_data_from_db('2022-12-31')
+    assert df['Close'].tolist() == symbol_data['Close'].tolist()
+    assert connect_to_sqlite.get_panel_cache().rowid == 10
+
+
+def test_symbol_blocks_match_the_full_read(db):
+    db.execute(SPY_STOCK_DATA)
+    _append(db, pd.concat([bars(Symbol, np.linspace(10, 20, 10) * (i + 1)) for i, Symbol in enumerate('CAB')]))
+    full = get_historical_data_from_db('2022-01-12', use_cache=False)
+    for symbols, expected in [(None, ['A', 'B', 'C']), (['C', 'A'], ['A', 'C'])]:
+        # Batches smaller than a symbol's block
+        blocks = list(iter_symbol_data('2022-01-12', symbols=symbols, batch_size=3))
+        assert [Symbol for Symbol, block in blocks] == expected
+        for Symbol, block in blocks:
+            assert len(block) == 8
+            pd.testing.assert_frame_equal(block, full[full['Symbol'] == Symbol])
@@ -0,0 +1,23 @@
+import pandas as pd
+
+from conftest import bars, walk
+from parallel_scoring import score_panel_parallel, score_symbols_parallel, scoring_pool
+from score_technical_analysis import score_symbols
+from vectorized_scoring import build_panel, score_panel
+
+
+def _historical_data():
+    return pd.concat([bars(f'S{i}', walk(60, 5 + i), i)
+                      for i in range(3)])
+
+
+def test_parallel_matches_serial():
+    historical_data = _historical_data()
+    panel = build_panel(historical_data)
+    assert (score_panel_parallel(panel, workers=2) == score_panel(panel)).all()
+    # One pool scores every day, as calculate_total_score uses it
+    with scoring_pool(2) as pool:
+        for date in historical_data.index.unique()[-2:]:
+            day_data = historical_data[historical_data.index <= date]
+            date_str = date.strftime('%Y-%m-%d')
+            assert score_symbols_parallel(day_data, date_str, 2, pool) == score_symbols(day_data, date_str)
@@ -0,0 +1,76 @@
+import pandas as pd
+import pytest
+
+import connect_to_sqlite
+from conftest import bars, walk
+from connect_to_sqlite import signal_columns
+from download_spy_stocks import FakeProvider, download_spy_stocks
+from pipeline import SymbolScorer, run_pipeline
+from total_score import calculate_total_score
+
+END_DATE = '2022-01-21'
+
+
+def _history(symbols):
+    frames = [bars(Symbol, walk(15, 10 + i), i) for i, Symbol in enumerate(symbols)]
+    return pd.concat(frames).reset_index()[['Date', 'Symbol', 'Open', 'High', 'Low', 'Close', 'Volume']]
+
+
+@pytest.fixture
+def open_db(tmp_path, monkeypatch):
+    """Make tmp_path/name the DB_NAME, with spy_holdings_symbols listing symbols and every bar of saved ones saved."""
+
+    def open_db(name, symbols, saved=()):
+        connect_to_sqlite.close_connection()
+        monkeypatch.setattr(connect_to_sqlite, 'DB_NAME', str(tmp_path / name))
+        conn = connect_to_sqlite.get_connection()
+        conn.execute('CREATE TABLE spy_holdings_symbols (symbol TEXT, company_name TEXT)')
+        conn.executemany('INSERT INTO spy_holdings_symbols VALUES (?, ?)', [(Symbol, Symbol) for Symbol in symbols])
+        conn.commit()
+        if saved:
+            history = _history(symbols)
+            download_spy_stocks(FakeProvider(history[history['Symbol'].isin(saved)]), backoff=0, end_date=END_DATE)
+        return conn
+
+    yield open_db
+    connect_to_sqlite.close_connection()
+
+
+def _scores(conn):
+    return pd.read_sql(f'''
+    SELECT Symbol, technical_analysis_score, Rank, Analysis, Timestamp, {', '.join(signal_columns())}
+    FROM technical_analysis_score ORDER BY Timestamp, Symbol''', conn)
+
+
+@pytest.mark.parametrize('engine', ['vectorized', 'backtrader'])
+def test_pipeline_saves_what_download_then_score_saves(open_db, engine):
+    symbols = ['A', 'B', 'C']
+    provider = FakeProvider(_history(symbols), latency=0.001)
+    # C has no new bars, so the pipeline only scores it once the download is over
+    conn = open_db('serial.sqlite3', symbols, saved=['C'])
+    download_spy_stocks(provider, backoff=0, end_date=END_DATE)
+    calculate_total_score(engine=engine, end_date=END_DATE)
+    expected = _scores(conn)
+
+    conn = open_db('pipeline.sqlite3', symbols, saved=['C'])
+    run_pipeline(engine, queue_size=2, end_date=END_DATE, provider=provider, batch_size=1, backoff=0)
+    scores = _scores(conn)
+    assert set(scores['Symbol']) == set(symbols)
+    assert scores['Timestamp'].max() == END_DATE
+    pd.testing.assert_frame_equal(scores, expected)
+
+
+def test_scoring_failure_stops_the_download(open_db, monkeypatch):
+    symbols = [f'S{i}' for i in range(10)]
+    conn = open_db('db.sqlite3', symbols)
+
+    def score(self, symbols):
+        raise RuntimeError('scoring broke')
+
+    monkeypatch.setattr(SymbolScorer, 'score', score)
+    with pytest.raises(RuntimeError, match='scoring broke'):
+        run_pipeline(queue_size=1, end_date=END_DATE, provider=FakeProvider(_history(symbols), latency=0.02),
+                     batch_size=1, workers=1, backoff=0)
+    downloaded = conn.execute('SELECT COUNT(DISTINCT Symbol) FROM SPY_stock_data').fetchone()[0]
+    assert downloaded < len(symbols)
+    assert conn.execute('SELECT COUNT(*) FROM technical_analysis_score').fetchone()[0] == 0
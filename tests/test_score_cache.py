@@ -0,0 +1,17 @@
+import pandas as pd
+
+from conftest import bars, walk
+from score_cache import ScoreCache
+from score_technical_analysis import score_symbols
+
+
+def test_cached_scores_match_uncached(db):
+    closes = walk(120, 4, 0.0003)
+    # SHORT is too short for most strategies, whose failures are saved too
+    historical_data = pd.concat([bars('SHORT', closes[:4], 1), bars('WALK', closes, 2)])
+    date_str = historical_data.index.max().strftime('%Y-%m-%d')
+    expected = score_symbols(historical_data, date_str)
+    # Run, then read back from the strategy_result table by a new cache
+    assert score_symbols(historical_data, date_str, cache=ScoreCache()) == expected
+    assert score_symbols(historical_data, date_str, cache=ScoreCache()) == expected
+    assert db.execute('SELECT COUNT(*) FROM strategy_result WHERE Score IS NULL').fetchone()[0] > 0
@@ -0,0 +1,53 @@
+import sqlite3
+
+import pandas as pd
+
+import connect_to_sqlite
+from connect_to_sqlite import create_table, get_score_distribution, get_score_history, get_top_scores
+from connect_to_sqlite import save_many_to_sqlite
+
+
+def _save_scores(date, scores):
+    df = pd.DataFrame({'Symbol': list(scores), 'Score': list(scores.values()), 'Analysis': '', 'Timestamp': date})
+    df['Rank'] = df['Score'].rank(ascending=False, method='min').astype(int)
+    save_many_to_sqlite(df)
+
+
+def _rows(df):
+    return df.values.tolist()
+
+
+def test_top_and_bottom_scores_break_ties_by_symbol(db):
+    create_table()
+    _save_scores('2022-01-03', {'C': 3, 'E': 5, 'A': 3, 'D': -2, 'B': 5})
+    assert _rows(get_top_scores('2022-01-03', k=3)) == [['B', 5, 1], ['E', 5, 1], ['A', 3, 3]]
+    assert _rows(get_top_scores('2022-01-03', k=3, bottom=True)) == [['D', -2, 5], ['A', 3, 3], ['C', 3, 3]]
+    assert _rows(get_top_scores('2022-01-03', k=3, by='Score')) == [['B', 5, 1], ['E', 5, 1], ['A', 3, 3]]
+    assert _rows(get_top_scores('2022-01-03', k=3, by='Score', bottom=True)) == [
+        ['D', -2, 5], ['A', 3, 3], ['C', 3, 3]]
+    assert get_top_scores('2022-01-04').empty
+
+
+def test_score_history_and_distribution(db):
+    create_table()
+    _save_scores('2022-01-03', {'A': 3, 'B': 3, 'C': -1})
+    _save_scores('2022-01-04', {'A': -2, 'B': 4, 'C': -2})
+    _save_scores('2022-01-05', {'A': 1, 'B': 0, 'C': 0})
+    assert _rows(get_score_history('A', '2022-01-03', '2022-01-04')) == [['2022-01-03', 3, 1], ['2022-01-04', -2, 2]]
+    assert _rows(get_score_distribution('2022-01-04', '2022-01-05')) == [
+        ['2022-01-04', -2, 2], ['2022-01-04', 4, 1], ['2022-01-05', 0, 2], ['2022-01-05', 1, 1]]
+
+
+def test_cached_queries_see_new_scores(db):
+    create_table()
+    _save_scores('2022-01-03', {'A': 3})
+    assert _rows(get_top_scores('2022-01-03')) == [['A', 3, 1]]
+    # Saved by this process
+    _save_scores('2022-01-03', {'B': 5})
+    assert _rows(get_top_scores('2022-01-03')) == [['A', 3, 1], ['B', 5, 1]]
+    # Committed by another connection
+    with sqlite3.connect(connect_to_sqlite.DB_NAME) as other:
+        other.execute("INSERT INTO technical_analysis_score (Symbol, technical_analysis_score, Rank, Analysis, Timestamp) "
+                      "VALUES ('C', 7, 0, '', '2022-01-03')")
+    other.close()
+    assert _rows(get_top_scores('2022-01-03')) == [['C', 7, 0], ['A', 3, 1], ['B', 5, 1]]
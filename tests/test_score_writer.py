@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from connect_to_sqlite import ScoreWriter, create_table
+
+
+def _scores(Symbol, score, date='2022-01-03'):
+    return pd.DataFrame({'Symbol': [Symbol], 'Score': [score], 'Rank': [1], 'Analysis': [''], 'Timestamp': [date]})
+
+
+def _saved(db):
+    return db.execute('SELECT Symbol, technical_analysis_score, Timestamp FROM technical_analysis_score '
+                      'ORDER BY Symbol, Timestamp').fetchall()
+
+
+@pytest.mark.parametrize('background', [False, True])
+def test_saved_scores_are_kept_unless_replacing(db, background):
+    create_table()
+    with ScoreWriter(background=background) as writer:
+        writer.write(_scores('A', 4))
+        writer.write(_scores('A', -2))
+        writer.write(_scores('A', 1, '2022-01-04'))
+    assert _saved(db) == [('A', 4, '2022-01-03'), ('A', 1, '2022-01-04')]
+    with ScoreWriter(background=background, replace=True) as writer:
+        writer.write(_scores('A', -2))
+    assert _saved(db) == [('A', -2, '2022-01-03'), ('A', 1, '2022-01-04')]
+
+
+def test_background_error_is_raised_on_close(db):
+    create_table()
+    with pytest.raises(KeyError):
+        with ScoreWriter(background=True) as writer:
+            writer.write(_scores('A', 4).drop(columns='Rank'))
+            writer.write(_scores('B', 3))
+    # The frames after the failed one are not written
+    assert _saved(db) == []
+
+
+def test_error_in_the_block_wins_over_the_background_error(db):
+    create_table()
+    with pytest.raises(RuntimeError):
+        with ScoreWriter(background=True) as writer:
+            writer.write(_scores('A', 4).drop(columns='Rank'))
+            raise RuntimeError('scoring failed')
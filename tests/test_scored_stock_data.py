@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from conftest import SPY_STOCK_DATA, bars, walk
+from connect_to_sqlite import create_table, get_scored_stock_data, save_many_to_sqlite, save_to_sqlite
+from download_spy_stocks import FakeProvider, download_spy_stocks
+from pipeline import run_pipeline
+
+
+def _save_score(Symbol, date, score):
+    save_many_to_sqlite(pd.DataFrame({'Symbol': [Symbol], 'Score': [score], 'Rank': [1], 'Analysis': [''],
+                                      'Timestamp': [date]}))
+
+
+def _save_bar(db, Symbol, date, close):
+    with db:
+        db.execute("INSERT INTO SPY_stock_data (Date, Market, Symbol, Company_name, Close) VALUES (?, 'US', ?, ?, ?)",
+                   (date, Symbol, Symbol, close))
+
+
+def _holdings(db, symbols):
+    db.execute('CREATE TABLE spy_holdings_symbols (symbol TEXT, company_name TEXT)')
+    db.executemany('INSERT INTO spy_holdings_symbols VALUES (?, ?)', [(Symbol, Symbol) for Symbol in symbols])
+    db.commit()
+
+
+def test_scores_saved_before_stock_data_exists(db):
+    create_table()
+    _save_score('A', '2022-01-03', 4)
+    save_to_sqlite('B', 2, 2, 'text', '2022-01-03')
+    # The downloader creating SPY_stock_data joins the scores saved so far
+    _holdings(db, ['A'])
+    history = bars('A', np.array([10.0, 11.0])).reset_index()
+    download_spy_stocks(FakeProvider(history), backoff=0, end_date='2022-01-05')
+    assert get_scored_stock_data('2022-01-01', '2022-01-31').values.tolist() == [['2022-01-03', 'A', 10.0, 4]]
+    _save_score('A', '2022-01-04', -1)
+    assert get_scored_stock_data('2022-01-04', '2022-01-31').values.tolist() == [['2022-01-04', 'A', 11.0, -1]]
+
+
+def test_pipeline_on_an_empty_database(db):
+    # Scored and read back by the backtests in the same process
+    symbols = ['A', 'B']
+    _holdings(db, symbols)
+    history = pd.concat([bars(Symbol, walk(10, i), i) for i, Symbol in enumerate(symbols)]).reset_index()
+    run_pipeline(end_date='2022-01-14', provider=FakeProvider(history), backoff=0)
+    scored = db.execute("""
+    SELECT COUNT(*) FROM technical_analysis_score t JOIN SPY_stock_data s ON s.Date = t.Timestamp AND s.Symbol = t.Symbol
+    """).fetchone()[0]
+    assert scored == 18
+    assert len(get_scored_stock_data('2022-01-01', '2022-01-31')) == scored
+
+
+def test_joined_row_in_either_insert_order(db):
+    db.execute(SPY_STOCK_DATA)
+    create_table()
+    # A day scored before its bar is downloaded, and a bar saved before its score
+    _save_score('A', '2022-01-03', 4)
+    _save_bar(db, 'A', '2022-01-03', 10.0)
+    _save_bar(db, 'B', '2022-01-03', 20.0)
+    _save_score('B', '2022-01-03', -3)
+    assert get_scored_stock_data('2022-01-01', '2022-01-31', by_symbol=True).values.tolist() == [
+        ['2022-01-03', 'A', 10.0, 4], ['2022-01-03', 'B', 20.0, -3]]
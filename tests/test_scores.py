@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import SPY_STOCK_DATA, bars
+from connect_to_sqlite import create_table, get_scores, save_many_to_sqlite
+from strategy_specs import STRATEGIES
+from total_score import backfill_total_score, calculate_total_score
+from vectorized_scoring import FAILED, analysis_from_signals, decode
+
+
+def test_saved_signals_read_back_as_analysis_text(db):
+    create_table()
+    signals = tuple([0] * (len(STRATEGIES) - 1) + [FAILED])
+    score = decode(STRATEGIES, signals)[0]
+    save_many_to_sqlite(pd.DataFrame({'Symbol': ['A'], 'Score': [score], 'Rank': [1], 'Analysis': ['unused'],
+                                      'Timestamp': ['2022-01-03'], 'Signals': [signals]}))
+    df = get_scores('2022-01-01', '2022-01-31')
+    assert df['Analysis'].tolist() == [analysis_from_signals('A', signals)]
+
+
+def test_engines_print_only_when_verbose(db, capsys):
+    db.execute(SPY_STOCK_DATA)
+    symbol_data = bars('A', np.linspace(10, 20, 10))
+    symbol_data.index = symbol_data.index.strftime('%Y-%m-%d')
+    symbol_data.to_sql('SPY_stock_data', db, if_exists='append')
+    db.commit()
+    calculate_total_score(engine='vectorized', end_date='2022-01-10')
+    assert capsys.readouterr().out == ''
+    with pd.option_context('display.max_columns', None, 'display.width', None):
+        calculate_total_score(engine='vectorized', end_date='2022-01-14', verbose=True)
+    lines = capsys.readouterr().out.splitlines()[1:]
+    saved = db.execute("SELECT Symbol, technical_analysis_score, Rank, Timestamp FROM technical_analysis_score "
+                       "WHERE Timestamp > '2022-01-10' ORDER BY Timestamp").fetchall()
+    assert len(lines) == len(saved) == 4
+    for line, row in zip(lines, saved):
+        assert line.split()[1:3] == ['A', str(row[1])] and line.split()[-1] == str(row[2]) and row[3] in line
+
+
+@pytest.mark.parametrize('options', [
+    {'workers': 2, 'stream': True},
+    {'workers': 2, 'memo': True},
+    {'engine': 'incremental', 'workers': 2},
+    {'engine': 'vectorized', 'stream': True},
+    {'engine': 'incremental', 'memo': True},
+])
+def test_unsupported_options_raise(db, options):
+    with pytest.raises(ValueError):
+        calculate_total_score(**options)
+
+
+def test_streamed_backfill_takes_no_workers(db):
+    with pytest.raises(ValueError):
+        backfill_total_score(workers=2, stream=True)
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import bars, walk
+from incremental_scoring import SymbolState
+from score_technical_analysis import score_symbol
+from strategy_specs import STRATEGIES
+from streaming_scoring import Bar, StreamingScorer
+from vectorized_scoring import FAILED, build_panel, decode, score_blocks_history, score_history, score_panel
+
+# The vectorized, incremental and streaming engines must give every strategy
+# the signal code backtrader gives it on the bars up to the same day.
+
+
+@pytest.fixture(scope='module')
+def historical_data():
+    closes = walk(260, 1, 0.0003)
+    flat = bars('FLAT', np.full(80, 50.0))
+    flat[['Open', 'High', 'Low']] = 50.0
+    flat['Volume'] = 1000000.0
+    return pd.concat([bars('SHORT', closes[:5], 2), flat, bars('WALK', closes, 3)])
+
+
+@pytest.fixture(scope='module')
+def vectorized(historical_data):
+    panel = build_panel(historical_data)
+    return panel, score_panel(panel)
+
+
+def symbol_codes(vectorized, Symbol):
+    panel, codes = vectorized
+    row = list(panel.symbols).index(Symbol)
+    return codes[:, row, :panel.lengths[row]]
+
+
+@pytest.mark.parametrize('Symbol, ends', [
+    ('SHORT', [1, 2, 3, 4, 5]),
+    ('FLAT', [30, 60, 80]),
+    ('WALK', [20, 35, 60, 100, 150, 200, 259, 260]),
+])
+def test_vectorized_matches_backtrader(historical_data, vectorized, Symbol, ends):
+    symbol_data = historical_data[historical_data['Symbol'] == Symbol]
+    codes = symbol_codes(vectorized, Symbol)
+    for end in ends:
+        signals = score_symbol(Symbol, symbol_data.iloc[:end], symbol_data.index[end - 1].strftime('%Y-%m-%d'))[3]
+        assert signals is not None, f"{Symbol} bar {end}: a backtrader result has no code"
+        assert list(codes[:, end - 1]) == list(signals), f"{Symbol} bar {end}"
+
+
+def test_walk_scores_every_strategy(vectorized):
+    # The normal series is long enough for no strategy to fail on its last bar
+    assert FAILED not in symbol_codes(vectorized, 'WALK')[:, -1]
+
+
+@pytest.mark.parametrize('Symbol', ['SHORT', 'FLAT', 'WALK'])
+def test_incremental_matches_vectorized(historical_data, vectorized, Symbol):
+    symbol_data = historical_data[historical_data['Symbol'] == Symbol]
+    codes = symbol_codes(vectorized, Symbol)
+    state = SymbolState(STRATEGIES)
+    for bar, (date, open, high, low, close, volume) in enumerate(
+            symbol_data[['Open', 'High', 'Low', 'Close', 'Volume']].itertuples(name=None)):
+        assert state.advance(date, open, high, low, close, volume) == list(codes[:, bar]), f"{Symbol} bar {bar + 1}"
+
+
+def test_streaming_matches_vectorized(historical_data, vectorized):
+    scorer = StreamingScorer()
+    panel, codes = vectorized
+    for date, row in historical_data.sort_index(kind='stable').iterrows():
+        update = scorer.update(Bar(date.strftime('%Y-%m-%d'), row['Symbol'], row['Open'], row['High'], row['Low'],
+                                   row['Close'], row['Volume']))
+        symbol = list(panel.symbols).index(row['Symbol'])
+        bar = int(np.flatnonzero(panel.dates[symbol] == np.datetime64(date))[0])
+        assert update.Score == decode(STRATEGIES, codes[:, symbol, bar])[0], f"{row['Symbol']} {date:%Y-%m-%d}"
+
+
+def test_empty_panel_scores_nothing(historical_data):
+    # No symbols, or no days in the range, saves nothing, like the backtrader engine
+    empty = historical_data.iloc[:0]
+    assert score_panel(build_panel(empty)).shape == (len(STRATEGIES), 0, 0)
+    columns = ['Symbol', 'Score', 'Analysis', 'Timestamp', 'Signals', 'Rank']
+    for df_results in [score_history(empty, '2022-01-03', '2022-02-01'),
+                       score_blocks_history(iter([]), '2022-01-03', '2022-02-01'),
+                       score_history(historical_data, '2021-01-01', '2021-12-31')]:
+        assert df_results.empty
+        assert list(df_results.columns) == columns
@@ -0,0 +1,16 @@
+import pandas as pd
+
+from conftest import bars, walk
+from vectorized_scoring import build_panel
+from walk_forward import WalkForward, candidate_grid
+
+
+def test_parallel_and_serial_pick_the_same_candidates():
+    panel = build_panel(pd.concat([
+        bars(f'S{i}', walk(120, 9 + i, 0.0005), i) for i in range(4)]))
+    candidates = [{}] + candidate_grid('RsiStrategy', rsi_period=[3, 8]) \
+        + candidate_grid('MovingAverageCrossover', short_window=[2, 4], long_window=[10])
+    serial = WalkForward(panel).run(candidates, train_days=40, test_days=20)
+    parallel = WalkForward(panel, workers=2).run(candidates, train_days=40, test_days=20)
+    assert len(serial) == 4
+    pd.testing.assert_frame_equal(parallel, serial)
@@ -0,0 +1,142 @@
+import contextlib
+
+import pandas as pd
+
+from connect_to_sqlite import create_table, get_connection, get_historical_data_from_db, get_panel_cache
+from connect_to_sqlite import iter_symbol_data, save_indicator_states, save_many_to_sqlite, ScoreWriter
+from metrics import timer
+
+# Daily scoring of every symbol with one of the engines. Each engine is
+# imported by the branch that uses it, so the vectorized and incremental
+# engines run without importing backtrader and the strategy classes of
+# score_technical_analysis, which re-exports these functions.
+
+
+def next_score_date(start_date_score='2022-01-01'):
+    """The first day without saved scores."""
+    cursor = get_connection().cursor()
+    cursor.execute("SELECT MAX(Timestamp) FROM technical_analysis_score")
+    max_date = cursor.fetchone()[0]
+    if max_date is not None:
+        return pd.Timestamp(max_date) + pd.DateOffset(1)
+    return pd.Timestamp(start_date_score)
+
+
+def calculate_total_score(engine='backtrader', workers=None, verbose=False, stream=False, memo=None,
+                          end_date=None):
+    """Score every symbol for each day since the last saved Timestamp up to end_date, today by default.
+
+    engine='vectorized' computes the same scores and messages with the NumPy
+    implementation in vectorized_scoring, scoring all remaining days in one pass
+    instead of one Cerebro run per symbol, strategy and day. engine='incremental'
+    advances the indicator state saved by the previous run through the new bars only.
+    workers spreads the backtrader and vectorized engines over that many processes.
+    verbose prints the scores saved, and every symbol of the backtrader engine as it goes.
+    stream=True has the serial backtrader engine read one symbol at a time
+    with iter_symbol_data instead of loading every symbol's history at once. memo has the serial backtrader
+    engine reuse the strategy results saved in score_cache for unchanged bars,
+    skipping symbols without a new bar since the day before altogether. It is
+    on by default for that engine. Raises ValueError for the options the
+    chosen engine does not support.
+    """
+    if workers and engine == 'incremental':
+        raise ValueError('the incremental engine runs in one process, it takes no workers')
+    if (stream or memo) and (workers or engine != 'backtrader'):
+        raise ValueError('stream and memo are options of the serial backtrader engine')
+    if memo is None:
+        memo = engine == 'backtrader' and not workers
+    create_table()
+    end_date_score = pd.Timestamp(end_date) if end_date is not None else pd.Timestamp.now()
+    current_date = next_score_date()
+
+    if engine == 'vectorized' and current_date <= end_date_score:
+        # One pass over the history scores every remaining day at once
+        from vectorized_scoring import score_panel_history
+        with timer('load'):
+            panel = get_panel_cache().price_panel(end_date_score.strftime('%Y-%m-%d'))
+        with timer('score'):
+            df_results = score_panel_history(panel, current_date, end_date_score, workers=workers)
+        save_many_to_sqlite(df_results)
+        if verbose:
+            print(df_results)
+        return
+
+    if engine == 'incremental' and current_date <= end_date_score:
+        from incremental_scoring import update_scores
+        with timer('score'):
+            df_results, states = update_scores(current_date, end_date_score)
+        save_many_to_sqlite(df_results)
+        save_indicator_states(states)
+        if verbose:
+            print(df_results)
+        return
+
+    from score_technical_analysis import score_symbols
+    if memo:
+        from score_cache import ScoreCache
+        cache = ScoreCache()
+    else:
+        cache = None
+    if workers:
+        from parallel_scoring import scoring_pool
+        pool = scoring_pool(workers)
+    else:
+        pool = contextlib.nullcontext()
+    # Each day is saved in one transaction by a background thread while the next day is scored
+    with pool, ScoreWriter(background=True) as writer:
+        while current_date <= end_date_score:
+            date_str = current_date.strftime('%Y-%m-%d')
+            if stream:
+                # Read lazily while scoring, one symbol block at a time
+                historical_data = iter_symbol_data(date_str)
+            else:
+                with timer('load'):
+                    historical_data = get_historical_data_from_db(date_str)
+
+            current_date += pd.Timedelta(days=1)
+
+            end_date = date_str
+
+            with timer('score'):
+                if workers:
+                    from parallel_scoring import score_symbols_parallel
+                    results = score_symbols_parallel(historical_data, date_str, workers, pool)
+                else:
+                    results = score_symbols(historical_data, date_str, verbose, cache)
+
+            with timer('rank'):
+                df_results = pd.DataFrame(results, columns=['Symbol', 'Score', 'Analysis', 'Signals'])
+                df_results['Rank'] = df_results['Score'].rank(ascending=False, method='min').astype(int)
+
+            writer.write(df_results.assign(Timestamp=end_date))
+
+            if verbose:
+                print(df_results)
+
+
+def backfill_total_score(start_date='2022-01-01', end_date=None, workers=None, stream=False, verbose=False):
+    """Rebuild the saved scores of every day in the range, e.g. after a strategy change.
+
+    stream=True scores one symbol at a time from iter_symbol_data, keeping only
+    that symbol's prices and every symbol's signal codes in memory, in this
+    process, so it takes no workers. verbose prints the scores saved.
+    """
+    if stream and workers:
+        raise ValueError('stream=True scores in one process, it takes no workers')
+    from vectorized_scoring import score_blocks_history, score_panel_history
+    create_table()
+    end_date = pd.Timestamp(end_date) if end_date is not None else pd.Timestamp.now()
+    if stream:
+        with timer('score'):
+            df_results = score_blocks_history(iter_symbol_data(end_date.strftime('%Y-%m-%d')), start_date, end_date)
+        save_many_to_sqlite(df_results, replace=True)
+        if verbose:
+            print(df_results)
+        return
+    with timer('load'):
+        panel = get_panel_cache().price_panel(end_date.strftime('%Y-%m-%d'))
+    with timer('score'):
+        df_results = score_panel_history(panel, start_date, end_date, workers=workers)
+    save_many_to_sqlite(df_results, replace=True)
+    if verbose:
+        print(df_results)
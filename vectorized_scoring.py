@@ -0,0 +1,587 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from metrics import count, timer
+from panel_cache import PricePanel
+from strategy_specs import STRATEGIES, compose_analysis, strategy_params
+
+# Array version of the 20 backtrader strategies. Every symbol is one row of a
+# (symbol, bar) panel, left aligned so that column i is the symbol's i-th bar,
+# which lets every indicator warm up at the same column for all rows.
+# A strategy whose backtrader run would raise ZeroDivisionError is skipped by
+# calculate_total_score, so those bars get the code FAILED.
+
+FAILED = -1
+
+
+def build_panel(historical_data):
+    """Pivot the rows returned by get_historical_data_from_db into a left aligned price panel."""
+    codes, symbols = pd.factorize(historical_data['Symbol'])
+    # Keep each symbol's rows in the order backtrader would feed them
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    lengths = np.bincount(codes, minlength=len(symbols))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    bars = np.arange(len(codes)) - starts[codes]
+    shape = (len(symbols), int(lengths.max()) if len(lengths) else 0)
+
+    def pivot(values, fill):
+        out = np.full(shape, fill, dtype=values.dtype)
+        out[codes, bars] = values[order]
+        return out
+
+    fields = [pivot(historical_data[name].to_numpy(dtype=float), np.nan)
+              for name in ('Open', 'High', 'Low', 'Close', 'Volume')]
+    dates = pivot(pd.DatetimeIndex(historical_data.index).to_numpy(), np.datetime64('NaT'))
+    return PricePanel(np.asarray(symbols), dates, *fields, lengths)
+
+
+# Indicator helpers, each operating along the bar axis and leaving NaN where
+# backtrader has not reached the indicator's minimum period yet.
+
+def _shift(x, n):
+    out = np.full_like(x, np.nan)
+    out[:, n:] = x[:, :x.shape[1] - n]
+    return out
+
+
+def _window(x, period, reduce):
+    out = np.full_like(x, np.nan)
+    if x.shape[1] >= period:
+        out[:, period - 1:] = reduce(sliding_window_view(x, period, axis=1))
+    return out
+
+
+def _sma(x, period):
+    return _rolling_fsum(x, period) / period
+
+
+def _rolling_fsum(x, period):
+    """Window sums rounded like backtrader's math.fsum, kept as a running double-double sum."""
+    missing = np.isnan(x)
+    values = np.where(missing, 0.0, x)
+    hi = np.zeros(len(x))
+    lo = np.zeros(len(x))
+    out = np.full_like(x, np.nan)
+    for i in range(x.shape[1]):
+        hi, lo = _add(hi, lo, values[:, i])
+        if i >= period:
+            hi, lo = _add(hi, lo, -values[:, i - period])
+        if i >= period - 1:
+            out[:, i] = hi
+    window_nans = np.cumsum(missing, axis=1)
+    window_nans[:, period:] -= window_nans[:, :-period].copy()
+    out[window_nans > 0] = np.nan
+    return out
+
+
+def _add(hi, lo, value):
+    # TwoSum followed by renormalisation, the error term carries the lost bits
+    total = hi + value
+    virtual = total - hi
+    error = (hi - (total - virtual)) + (value - virtual) + lo
+    hi = total + error
+    return hi, error - (hi - total)
+
+
+def _highest(x, period):
+    return _window(x, period, lambda w: w.max(axis=-1))
+
+
+def _lowest(x, period):
+    return _window(x, period, lambda w: w.min(axis=-1))
+
+
+def _smoothing(x, period, alpha):
+    # ExponentialSmoothing: seeded with the SMA of the first full window
+    seed = _sma(x, period)
+    alpha1 = 1.0 - alpha
+    out = np.full_like(x, np.nan)
+    prev = np.full(len(x), np.nan)
+    for i in range(x.shape[1]):
+        prev = out[:, i] = np.where(np.isnan(prev), seed[:, i], prev * alpha1 + x[:, i] * alpha)
+    return out
+
+
+def _ema(x, period):
+    return _smoothing(x, period, 2.0 / (1.0 + period))
+
+
+def _smma(x, period):
+    return _smoothing(x, period, 1.0 / period)
+
+
+def _trix(x, period):
+    ema3 = _ema(_ema(_ema(x, period), period), period)
+    prev = _shift(ema3, 1)
+    return 100.0 * (_divide(ema3, prev) - 1.0), _zero_division(ema3, prev)
+
+
+def _pow(x, exponent):
+    # Python's pow rounds differently from numpy's power, and the bands of the
+    # short period strategies sit exactly on the close, so the last bit matters
+    return _python_pow(x, exponent).astype(float)
+
+
+_python_pow = np.frompyfunc(pow, 2, 1)
+
+
+def _bollinger(panel, source, period, devfactor):
+    mid = panel.indicator('sma', source, period)
+    mean_square = panel.indicator('sma', ('square', source), period)
+    stddev = devfactor * _pow(np.abs(mean_square - _pow(mid, 2)), 0.5)
+    return mid + stddev, mid - stddev
+
+
+def _divide(num, den):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return num / den
+
+
+def _zero_division(num, den):
+    """Bars at which backtrader's once() loop would raise ZeroDivisionError."""
+    return (den == 0) & ~np.isnan(num)
+
+
+def _select(conditions, minperiod, failed=None):
+    # Code i is the i-th message of the strategy, the last one is the fallback
+    codes = np.select(conditions, np.arange(len(conditions)), len(conditions)).astype(np.int8)
+    # get_score raises IndexError when the data is shorter than the strategy's minimum period
+    codes[:, :minperiod - 1] = FAILED
+    if failed is not None:
+        # runonce computes the whole history, so one bad bar fails every later date
+        codes[np.logical_or.accumulate(failed, axis=1)] = FAILED
+    return codes
+
+
+# Indicators shared between strategies. A strategy asks its panel for
+# panel.indicator(name, source, *params) instead of computing it, and each
+# distinct (name, source, params) is computed once per scored panel. A source
+# is a PricePanel field, one of INPUTS or the key tuple of another indicator.
+
+INDICATORS = {
+    'sma': _sma,
+    'ema': _ema,
+    'smma': _smma,
+    'highest': _highest,
+    'lowest': _lowest,
+    'shift': _shift,
+    'square': lambda x: _pow(x, 2),
+    'trix': _trix,
+}
+
+INPUTS = {
+    'typical_price': lambda panel: (panel.high + panel.low + panel.close) / 3.0,
+    'median_price': lambda panel: (panel.high + panel.low) / 2.0,
+}
+
+
+class Indicators:
+    """A PricePanel plus the indicators computed on it so far."""
+
+    def __init__(self, panel):
+        self.panel = panel
+        self.values = {}
+
+    def __getattr__(self, field):
+        return getattr(self.panel, field)
+
+    def indicator(self, name, source, *params):
+        key = (name, source, *params)
+        if key not in self.values:
+            self.values[key] = INDICATORS[name](self.input(source), *params)
+            count('indicators.computed')
+        else:
+            count('indicators.shared')
+        return self.values[key]
+
+    def input(self, source):
+        if isinstance(source, tuple):
+            return self.indicator(*source)
+        if source in INPUTS:
+            if source not in self.values:
+                self.values[source] = INPUTS[source](self.panel)
+            return self.values[source]
+        return getattr(self.panel, source)
+
+
+# One function per strategy returning the signal code at every bar of an Indicators
+
+def _moving_average_crossover(panel, p):
+    short_mavg = panel.indicator('sma', 'close', p['short_window'])
+    long_mavg = panel.indicator('sma', 'close', p['long_window'])
+    return _select([short_mavg > long_mavg], max(p['short_window'], p['long_window']) + 1)
+
+
+def _rsi(panel, p):
+    close = panel.close
+    diff = close - panel.indicator('shift', 'close', 1)
+    maup = _smma(np.maximum(diff, 0.0), p['rsi_period'])
+    madown = _smma(np.maximum(-diff, 0.0), p['rsi_period'])
+    rsi = 100.0 - 100.0 / (1.0 + _divide(maup, madown))
+    return _select([rsi < 30, rsi > 70], p['rsi_period'] + 1, _zero_division(maup, madown))
+
+
+def _bollinger_bands(panel, p):
+    top, bot = _bollinger(panel, 'close', p['period'], p['devfactor'])
+    return _select([panel.close > bot, panel.close < top], p['period'])
+
+
+def _bollinger_bands_rtm(panel, p):
+    top, bot = _bollinger(panel, 'close', p['period'], p['devfactor'])
+    return _select([panel.close < bot, panel.close > top], p['period'])
+
+
+def _commodity_channel_index(panel, p):
+    tp = panel.input('typical_price')
+    tpmean = panel.indicator('sma', 'typical_price', p['period'])
+    dev = tp - tpmean
+    den = 0.015 * _sma(np.abs(dev), p['period'])
+    cci = _divide(dev, den)
+    return _select([cci < -100, cci > 100], 2 * p['period'] - 1, _zero_division(dev, den))
+
+
+def _triple_exponential_moving_average(panel, p):
+    trix, failed = panel.indicator('trix', 'close', p['period'])
+    prev = _shift(trix, 1)
+    return _select([trix > prev, trix < prev], 3 * p['period'] - 1, failed)
+
+
+def _rate_of_change(panel, p):
+    dperiod = panel.indicator('shift', 'close', p['period'])
+    change = panel.close - dperiod
+    roc = _divide(change, dperiod)
+    return _select([roc > 0, roc < 0], p['period'] + 1, _zero_division(change, dperiod))
+
+
+def _parabolic_sar(panel, p):
+    high, low, close = panel.high, panel.low, panel.close
+    af0, afmax = p['af'], p['afmax']
+    sar_line = np.full_like(close, np.nan)
+    if close.shape[1] >= 2:
+        # State after ParabolicSAR.nextstart on the second bar
+        uptrend = close[:, 1] >= close[:, 0]
+        tr = ~uptrend
+        ep = np.where(uptrend, low[:, 0], high[:, 0])
+        sar = (high[:, 1] + low[:, 1]) / 2.0
+        af = np.full(len(close), af0)
+    for i in range(1, close.shape[1]):
+        hi, lo = high[:, i], low[:, i]
+        reverse = (tr & (sar >= lo)) | (~tr & (sar <= hi))
+        tr = np.where(reverse, ~tr, tr)
+        sar = np.where(reverse, ep, sar)
+        ep = np.where(reverse, np.where(tr, hi, lo), ep)
+        af = np.where(reverse, af0, af)
+        sar_line[:, i] = sar
+
+        extend = np.where(tr, hi > ep, lo < ep)
+        ep = np.where(extend, np.where(tr, hi, lo), ep)
+        af = np.where(extend, np.minimum(af + af0, afmax), af)
+
+        sar = sar + af * (ep - sar)
+        lo1, hi1 = low[:, i - 1], high[:, i - 1]
+        sar = np.where(tr & ((sar > lo) | (sar > lo1)), np.minimum(lo, lo1), sar)
+        sar = np.where(~tr & ((sar < hi) | (sar < hi1)), np.maximum(hi, hi1), sar)
+    return _select([close > sar_line], 2)
+
+
+def _awesome_oscillator(panel, p):
+    ao = panel.indicator('sma', 'median_price', 5) - panel.indicator('sma', 'median_price', 34)
+    prev = _shift(ao, 1)
+    return _select([(ao > 0) & (ao > prev), (ao < 0) & (ao < prev)], 34)
+
+
+def _heikin_ashi(panel, p):
+    ha_close = (panel.open + panel.high + panel.low + panel.close) / 4.0
+    ha_open = np.full_like(ha_close, np.nan)
+    if ha_close.shape[1]:
+        ha_open[:, 0] = (panel.open[:, 0] + panel.close[:, 0]) / 2.0
+    for i in range(1, ha_close.shape[1]):
+        ha_open[:, i] = (ha_open[:, i - 1] + ha_close[:, i - 1]) / 2.0
+    # HeikinAshi forces next mode, which does not raise on short data
+    return _select([ha_close > ha_open, ha_close < ha_open], 1)
+
+
+def _bollinger_bands_breakout(panel, p):
+    top, bot = _bollinger(panel, 'close', p['period'], p['devfactor'])
+    return _select([panel.close > top, panel.close < bot], p['period'])
+
+
+def _stochastic(panel, p):
+    lowestlow = panel.indicator('lowest', 'low', p['period'])
+    knum = panel.close - lowestlow
+    kden = panel.indicator('highest', 'high', p['period']) - lowestlow
+    perc_k = _sma(100.0 * _divide(knum, kden), 3)
+    perc_d = _sma(perc_k, 3)
+    return _select([(perc_k > p['upper']) & (perc_d > p['upper']),
+                    (perc_k < p['lower']) & (perc_d < p['lower'])],
+                   p['period'] + 4, _zero_division(knum, kden))
+
+
+def _trix_cross(panel, p):
+    trix, failed = panel.indicator('trix', 'close', p['period'])
+    signal = _smma(trix, p['period'])
+    return _select([trix > signal, trix < signal], 4 * p['period'] - 2, failed)
+
+
+def _momentum(panel, p):
+    momentum = panel.close - panel.indicator('shift', 'close', p['period'])
+    return _select([momentum > 0, momentum < 0], p['period'] + 1)
+
+
+def _volume_breakout(panel, p):
+    sma = panel.indicator('sma', 'close', p['sma_period'])
+    breakout = panel.volume > panel.indicator('sma', 'volume', p['sma_period']) * p['volume_multiplier']
+    return _select([breakout & (panel.close > sma), breakout], p['sma_period'])
+
+
+def _vwap(panel, p):
+    cum_vol = np.cumsum(panel.volume, axis=1)
+    cum_vol_price = np.cumsum(panel.volume * panel.close, axis=1)
+    vwap = _divide(cum_vol_price, cum_vol)
+    return _select([panel.close > vwap, panel.close < vwap], 1,
+                   _zero_division(cum_vol_price, cum_vol))
+
+
+def _macd(panel, p):
+    macd = panel.indicator('ema', 'close', p['fast_length']) - panel.indicator('ema', 'close', p['slow_length'])
+    signal = _ema(macd, p['signal_length'])
+    return _select([macd > signal, macd < signal], max(p['fast_length'], p['slow_length']) + p['signal_length'] - 1)
+
+
+def _obv(panel, p):
+    prev_close = panel.indicator('shift', 'close', 1)
+    volume_diff = np.where(panel.close > prev_close, panel.volume, -panel.volume)
+    volume_diff[:, :1] = np.nan
+    obv = np.cumsum(np.nan_to_num(volume_diff), axis=1)
+    obv[np.isnan(volume_diff)] = np.nan
+    prev = _shift(obv, 1)
+    return _select([obv > prev, obv < prev], 2)
+
+
+def _sma_long(panel, p):
+    short_sma = panel.indicator('sma', 'close', p['short_window'])
+    long_sma = panel.indicator('sma', 'close', p['long_window'])
+    return _select([short_sma > long_sma], max(p['short_window'], p['long_window']))
+
+
+def _support_resistance(panel, p):
+    support = panel.indicator('lowest', 'low', p['support_resistance_period'])
+    resistance = panel.indicator('highest', 'high', p['support_resistance_period'])
+    return _select([panel.close > resistance, panel.close < support], p['support_resistance_period'])
+
+
+# Strategy name -> (scorer, ((score, message), ...)) in the order of the codes returned by the scorer
+# The saved scores keep these codes and get_scores rebuilds their text from
+# here, so a result's code must not change: add new results at the end.
+VECTORIZED_STRATEGIES = {
+    'MovingAverageCrossover': (_moving_average_crossover, (
+        (1, "Short-term MA is above Long-term MA."),
+        (-1, "Short-term MA is below Long-term MA."))),
+    'RsiStrategy': (_rsi, (
+        (1, "RSI indicates oversold conditions."),
+        (-1, "RSI indicates overbought conditions."),
+        (0, "RSI is neutral."))),
+    'BollingerBandsStrategy': (_bollinger_bands, (
+        (1, "Stock price is above the lower Bollinger Band."),
+        (-1, "Stock price is below the upper Bollinger Band."),
+        (0, "Stock price is within the Bollinger Bands."))),
+    'BollingerBandsRTM': (_bollinger_bands_rtm, (
+        (1, "Stock price is below the lower Bollinger Band."),
+        (-1, "Stock price is above the upper Bollinger Band."),
+        (0, "Stock price is within the Bollinger Bands."))),
+    'CommodityChannelIndex': (_commodity_channel_index, (
+        (1, "CCI indicates a potential price reversal to the upside."),
+        (-1, "CCI indicates a potential price reversal to the downside."),
+        (0, "CCI is neutral."))),
+    'TripleExponentialMovingAverage': (_triple_exponential_moving_average, (
+        (1, "TRIX is showing upward momentum."),
+        (-1, "TRIX is showing downward momentum."),
+        (0, "TRIX is neutral."))),
+    'RateOfChange': (_rate_of_change, (
+        (1, "Rate of Change indicates positive momentum."),
+        (-1, "Rate of Change indicates negative momentum."),
+        (0, "Rate of Change is neutral."))),
+    'ParabolicSARReversal': (_parabolic_sar, (
+        (1, "Price is above Parabolic SAR indicating bullish trend."),
+        (-1, "Price is below Parabolic SAR indicating bearish trend."))),
+    'AwesomeOscillatorCross': (_awesome_oscillator, (
+        (1, "Awesome Oscillator is positive and increasing."),
+        (-1, "Awesome Oscillator is negative and decreasing."),
+        (0, "Awesome Oscillator is neutral."))),
+    'HeikinAshiTrend': (_heikin_ashi, (
+        (1, "Heikin Ashi candle is bullish."),
+        (-1, "Heikin Ashi candle is bearish."),
+        (0, "Heikin Ashi candle is neutral."))),
+    'BollingerBandsBreakout': (_bollinger_bands_breakout, (
+        (1, "Stock price broke above the upper Bollinger Band."),
+        (-1, "Stock price broke below the lower Bollinger Band."),
+        (0, "Stock price is within the Bollinger Bands."))),
+    'StochasticCross': (_stochastic, (
+        (-1, "Stochastic indicates overbought conditions."),
+        (1, "Stochastic indicates oversold conditions."),
+        (0, "Stochastic is neutral."))),
+    'TRIXCross': (_trix_cross, (
+        (1, "TRIX is above its signal line indicating bullish momentum."),
+        (-1, "TRIX is below its signal line indicating bearish momentum."),
+        (0, "TRIX is neutral with its signal line."))),
+    'Momentum': (_momentum, (
+        (1, "Momentum is positive indicating bullish trend."),
+        (-1, "Momentum is negative indicating bearish trend."),
+        (0, "Momentum is neutral."))),
+    'VolumeBreakout': (_volume_breakout, (
+        (1, "Significant volume breakout detected with price above the moving average."),
+        (-1, "Significant volume breakout detected with price below the moving average."),
+        (0, "No significant volume breakout detected."))),
+    'VWAPStrategy': (_vwap, (
+        (1, "Price is above VWAP indicating bullish trend."),
+        (-1, "Price is below VWAP indicating bearish trend."),
+        (0, "Price is around VWAP indicating a neutral trend."))),
+    'MACDStrategy': (_macd, (
+        (1, "MACD line is above the signal line indicating bullish momentum."),
+        (-1, "MACD line is below the signal line indicating bearish momentum."),
+        (0, "MACD line is crossing the signal line."))),
+    'OBVStrategy': (_obv, (
+        (1, "On-Balance Volume is increasing, indicating buying pressure."),
+        (-1, "On-Balance Volume is decreasing, indicating selling pressure."),
+        (0, "On-Balance Volume is stable."))),
+    'SMAStrategy': (_sma_long, (
+        (1, "Short-term MA is above Long-term MA in the long time."),
+        (-1, "Short-term MA is below Long-term MA in the long time."))),
+    'SupportResistanceStrategy': (_support_resistance, (
+        (1, "Price broke above resistance."),
+        (-1, "Price broke below support."),
+        (0, "Price is within support and resistance."))),
+}
+
+
+def score_panel(panel, strategies=STRATEGIES):
+    """Return the signal codes of every strategy as an array of shape (strategy, symbol, bar).
+
+    The strategies share the indicators they have in common.
+    """
+    indicators = Indicators(panel)
+    codes = []
+    for strategy in strategies:
+        with timer(f'score.{strategy.name}'):
+            codes.append(VECTORIZED_STRATEGIES[strategy.name][0](indicators, strategy_params(strategy)))
+    return np.stack(codes)
+
+
+def decode(strategies, codes):
+    """Turn the codes of one symbol on one bar into the total score and analysis messages."""
+    total_score = 0
+    strategy_analysis = []
+    for strategy, code in zip(strategies, codes):
+        if code == FAILED:
+            continue
+        score, analysis_message = VECTORIZED_STRATEGIES[strategy.name][1][code]
+        total_score += score
+        strategy_analysis.append(analysis_message)
+    return total_score, strategy_analysis
+
+
+def signal_code(name, score, analysis_message):
+    """The code of a (score, message) result of the backtrader strategy of that name, None if it has none."""
+    for code, result in enumerate(VECTORIZED_STRATEGIES[name][1]):
+        if result == (score, analysis_message):
+            return code
+    return None
+
+
+def analysis_from_signals(Symbol, signals, strategies=STRATEGIES):
+    """Rebuild the Analysis text of a saved signal vector from the message tables."""
+    total_score, strategy_analysis = decode(strategies, signals)
+    return compose_analysis(Symbol, total_score, strategy_analysis)
+
+
+def parse_analysis(analysis, strategies=STRATEGIES):
+    """The signal vector an Analysis text was composed from, or None if it cannot be matched."""
+    if 'Details: \n' not in analysis:
+        return None
+    details = analysis.split('Details: \n', 1)[1]
+    messages = details.split('\n') if details else []
+    signals = []
+    for strategy in strategies:
+        # Skipped strategies leave no message, so match in strategy order
+        code = FAILED
+        if messages:
+            for candidate, (score, analysis_message) in enumerate(VECTORIZED_STRATEGIES[strategy.name][1]):
+                if analysis_message == messages[0]:
+                    code = candidate
+                    messages.pop(0)
+                    break
+        signals.append(code)
+    return None if messages else tuple(signals)
+
+
+def score_history(historical_data, start_date, end_date, strategies=STRATEGIES, workers=None):
+    """Score every calendar day from start_date to end_date from a single pass over each symbol."""
+    return score_panel_history(build_panel(historical_data), start_date, end_date, strategies, workers)
+
+
+def score_panel_history(panel, start_date, end_date, strategies=STRATEGIES, workers=None):
+    """score_history for a PricePanel that is already built, e.g. by the panel cache.
+
+    With workers set, the symbols are scored by that many processes sharing the panel.
+    """
+    if workers:
+        from parallel_scoring import score_panel_parallel
+        codes = score_panel_parallel(panel, strategies, workers)
+    else:
+        codes = score_panel(panel, strategies)
+    return daily_results(panel.symbols,
+                         [dates[:length] for dates, length in zip(panel.dates, panel.lengths)],
+                         [codes[:, row, :length].T for row, length in enumerate(panel.lengths)],
+                         start_date, end_date, strategies)
+
+
+def score_blocks_history(blocks, start_date, end_date, strategies=STRATEGIES):
+    """score_history over (Symbol, rows) blocks such as iter_symbol_data yields, one symbol at a time."""
+    symbols, bar_dates, bar_codes = [], [], []
+    for Symbol, symbol_data in blocks:
+        panel = build_panel(symbol_data)
+        symbols.append(Symbol)
+        bar_dates.append(panel.dates[0])
+        bar_codes.append(score_panel(panel, strategies)[:, 0, :].T)
+    return daily_results(np.asarray(symbols, dtype=object), bar_dates, bar_codes, start_date, end_date, strategies)
+
+
+def daily_results(symbols, bar_dates, bar_codes, start_date, end_date, strategies=STRATEGIES):
+    """Build the rows calculate_total_score would save for every calendar day in the range.
+
+    Each day has every symbol with at least one bar up to that day, scored on
+    its latest bar and ranked against the other symbols of the same day.
+    bar_dates and bar_codes hold the dates and (bar, strategy) signal codes of
+    each symbol.
+    """
+    days = pd.date_range(pd.Timestamp(start_date).normalize(), end_date, freq='D')
+    if not len(symbols):
+        return pd.DataFrame(columns=['Symbol', 'Score', 'Analysis', 'Timestamp', 'Signals', 'Rank'])
+
+    # Index of the latest bar of every symbol on or before each day
+    last = np.stack([np.searchsorted(dates, days.to_numpy(), side='right') - 1 for dates in bar_dates])
+    rows, day_index = np.nonzero(last.T >= 0)[::-1]
+    bars = last[rows, day_index]
+
+    # Weekends and holidays repeat the previous bar, decode each signal vector once
+    offsets = np.concatenate(([0], np.cumsum([len(codes) for codes in bar_codes])[:-1]))
+    signals = np.concatenate(bar_codes).reshape(-1, len(strategies))[offsets[rows] + bars]
+    unique, inverse = np.unique(signals, axis=0, return_inverse=True)
+    decoded = [decode(strategies, vector) for vector in unique]
+
+    # Saved as the signal vector when the strategies are the ones the table has columns for
+    vectors = [tuple(vector.tolist()) if list(strategies) == STRATEGIES else None for vector in unique]
+
+    results = []
+    for row, day, vector in zip(rows, day_index, inverse.ravel()):
+        Symbol = symbols[row]
+        total_score, strategy_analysis = decoded[vector]
+        results.append((Symbol, total_score, compose_analysis(Symbol, total_score, strategy_analysis),
+                        days[day].strftime('%Y-%m-%d'), vectors[vector]))
+
+    with timer('rank'):
+        df_results = pd.DataFrame(results, columns=['Symbol', 'Score', 'Analysis', 'Timestamp', 'Signals'])
+        df_results['Rank'] = df_results.groupby('Timestamp')['Score'].rank(ascending=False, method='min').astype(int)
+    return df_results
@@ -0,0 +1,146 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from backtest_engine import Backtest
+from connect_to_sqlite import get_panel_cache
+from panel_cache import PricePanel
+from parallel_scoring import PANEL_FIELDS, SharedPanel, scoring_pool
+from strategy_specs import STRATEGIES, strategy_params
+from vectorized_scoring import FAILED, VECTORIZED_STRATEGIES, Indicators
+
+# Walk-forward search of the strategy params. A candidate maps some strategy
+# names to param overrides, e.g. {'RsiStrategy': {'rsi_period': 10}}, and the
+# strategies it does not mention keep their defaults. Every distinct
+# (strategy, params) is scored once over the whole history and shared by all
+# the candidates and windows that use it. The distinct ones are spread over a
+# process pool mapping the panel from shared memory, one task per strategy so
+# that its candidates share their indicators within the worker.
+
+
+def candidate_grid(name, **values):
+    """Candidates for every combination of the given param values of the strategy of that name."""
+    names = list(values)
+    return [{name: dict(zip(names, combination))} for combination in itertools.product(*values.values())]
+
+
+def describe(candidate):
+    return ', '.join(f"{strategy}({', '.join(f'{name}={value}' for name, value in params.items())})"
+                     for strategy, params in candidate.items()) or 'defaults'
+
+
+def _key(strategy, params):
+    return strategy, tuple(sorted(strategy_params(strategy, **params).items()))
+
+
+def _strategy_codes(panel, strategy, params):
+    indicators = panel if isinstance(panel, Indicators) else Indicators(panel)
+    return VECTORIZED_STRATEGIES[strategy.name][0](indicators, dict(params))
+
+
+def _shared_strategy_codes(spec, strategy, params_list):
+    with SharedPanel.attach(spec) as arrays:
+        panel = PricePanel(None, arrays['dates'].view('datetime64[ns]'),
+                           *(arrays[field] for field in PANEL_FIELDS), None)
+        indicators = Indicators(panel)
+        return [_strategy_codes(indicators, strategy, params) for params in params_list]
+
+
+class WalkForward:
+    """Scores and backtests param candidates over one PricePanel."""
+
+    def __init__(self, panel, m=2, n=-20, workers=None):
+        self.panel = panel
+        self.m = m
+        self.n = n
+        self.workers = workers
+        self.scores = {}
+        self.present = ~np.isnat(panel.dates)
+        rows, bars = np.nonzero(self.present)
+        self.rows = rows
+        self.bars = bars
+        self.bar_dates = panel.dates[rows, bars]
+        self.dates = np.unique(self.bar_dates)
+
+    def score(self, keys):
+        """Compute the per bar score of every (strategy, params) key not scored yet."""
+        groups = {}
+        for strategy, params in dict.fromkeys(keys):
+            if (strategy, params) not in self.scores:
+                groups.setdefault(strategy, []).append(params)
+        if not groups:
+            return
+        missing = [(strategy, params) for strategy, params_list in groups.items() for params in params_list]
+        if self.workers:
+            shared = SharedPanel(self.panel)
+            try:
+                with scoring_pool(self.workers) as pool:
+                    futures = [pool.submit(_shared_strategy_codes, shared.spec, strategy, params_list)
+                               for strategy, params_list in groups.items()]
+                    codes = [strategy_codes for future in futures for strategy_codes in future.result()]
+            finally:
+                shared.release()
+        else:
+            # Candidates differing only in thresholds share their indicators
+            indicators = Indicators(self.panel)
+            codes = [_strategy_codes(indicators, strategy, params) for strategy, params in missing]
+        for (strategy, params), strategy_codes in zip(missing, codes):
+            # A strategy that failed adds nothing, like decode skipping it
+            values = np.array([score for score, message in VECTORIZED_STRATEGIES[strategy.name][1]] + [0])
+            self.scores[strategy, params] = values[np.where(strategy_codes == FAILED, -1, strategy_codes)]
+
+    def total_scores(self, candidate):
+        keys = [_key(strategy, candidate.get(strategy.name, {})) for strategy in STRATEGIES]
+        self.score(keys)
+        return sum(self.scores[key] for key in keys)
+
+    def backtest(self, total_scores, start_date, end_date):
+        """Backtest built from the candidate's scores on the bars from start_date to end_date."""
+        window = (self.bar_dates >= start_date) & (self.bar_dates <= end_date)
+        rows, bars = self.rows[window], self.bars[window]
+        return Backtest(pd.DataFrame({
+            'Date': pd.DatetimeIndex(self.bar_dates[window]).strftime('%Y-%m-%d'),
+            'Symbol': self.panel.symbols[rows],
+            'Close': self.panel.close[rows, bars],
+            'technical_analysis_score': total_scores[rows, bars],
+        }))
+
+    def net_earning(self, candidate, start_date, end_date):
+        return self.backtest(self.total_scores(candidate), start_date, end_date).run(self.m, self.n).final_net_earning
+
+    def run(self, candidates, train_days=250, test_days=60, step=None):
+        """Pick the best candidate on each rolling train window and record how it does on the following test window.
+
+        Windows are counted in trading days and move forward by step (test_days by default).
+        """
+        step = step or test_days
+        self.score([_key(strategy, candidate.get(strategy.name, {}))
+                    for candidate in candidates for strategy in STRATEGIES])
+        totals = [self.total_scores(candidate) for candidate in candidates]
+
+        windows = []
+        for start in range(0, len(self.dates) - train_days - test_days + 1, step):
+            train = self.dates[start], self.dates[start + train_days - 1]
+            test = self.dates[start + train_days], self.dates[start + train_days + test_days - 1]
+            earnings = [self.backtest(total, *train).run(self.m, self.n).final_net_earning for total in totals]
+            best = int(np.argmax(earnings))
+            test_net_earning = self.backtest(totals[best], *test).run(self.m, self.n).final_net_earning
+            windows.append((*(pd.Timestamp(date).strftime('%Y-%m-%d') for date in train + test),
+                            describe(candidates[best]), earnings[best], test_net_earning))
+            print(f"{windows[-1][0]} - {windows[-1][3]}: {windows[-1][4]}, "
+                  f"train {earnings[best]}, test {test_net_earning}")
+
+        return pd.DataFrame(windows, columns=['train_start', 'train_end', 'test_start', 'test_end',
+                                              'candidate', 'train_net_earning', 'test_net_earning'])
+
+
+def walk_forward(candidates, end_time=None, train_days=250, test_days=60, step=None, m=2, n=-20, workers=None):
+    """Walk-forward optimization of the strategy params over SPY_stock_data, see WalkForward.run.
+
+    workers scores the strategies on that many processes, and None in this one,
+    where all the candidates share their indicators.
+    """
+    end_time = end_time or pd.Timestamp.now().strftime('%Y-%m-%d')
+    panel = get_panel_cache().price_panel(end_time)
+    return WalkForward(panel, m, n, workers).run(candidates, train_days, test_days, step)